@@ -0,0 +1,117 @@
+import asyncio
+import inspect
+
+from elevator import Elevator
+from game import StuckDetector, scenario_conclusion
+from scenarios import Scenario
+from state import state_view_for, update_controller
+
+# What to do when a controller's update() (or an event handler) is still busy when the next game second comes along:
+# BLOCK holds up the simulation until it's done, and CONTINUE lets the simulation carry on without it, with the
+# elevators doing whatever they were last told to do. Under CONTINUE, update() isn't called again until the previous
+# call finishes, and handlers' messages and commands take effect whenever they happen to finish.
+BLOCK = 'block'
+CONTINUE = 'continue'
+POLICIES = (BLOCK, CONTINUE)
+
+
+async def async_game_loop(scenario, building, controller, force_duration=None, after_tick=None, policy=BLOCK):
+    """Like game.game_loop(), but for controllers whose update() and event handlers are coroutines (async def), so
+    they can await things: a planner running in an executor, a server somewhere, and so on. Plain functions work too.
+    Returns the same (conclusion, elapsed) pair. The after_tick function, if there is one, can also be a coroutine.
+
+    Every game second ends by giving other tasks a turn, even if nothing else needed awaiting. Async handlers have to
+    be registered by the time the loop starts (in the controller's __init__, say) to be awaited; ones registered
+    later get called, but what they return is treated as a message."""
+    if policy not in POLICIES:
+        raise ValueError(f'unknown policy "{policy}"; should be one of {", ".join(POLICIES)}')
+
+    handler_runs = []
+
+    def capture_coroutines(event_name, handler):
+        def handle(source, *args):
+            result = handler(source, *args)
+            if inspect.isawaitable(result):
+                handler_runs.append((_origin(source), result))
+                return None
+            return result
+        return handle
+
+    for source in building.elevators + building.floors:
+        source.wrap_handlers(capture_coroutines)
+
+    controller_begin_second = getattr(controller, 'begin_second', None)
+    state = state_view_for(controller, building.elevators, building.floors)
+    update_task = None
+    handler_tasks = []
+    stuck = StuckDetector(building)
+    elapsed = 0
+    try:
+        while True:
+            if controller_begin_second is not None:
+                controller_begin_second(elapsed)
+            conclusion = scenario_conclusion(scenario, building, force_duration, elapsed)
+            if conclusion is not None:
+                return conclusion, elapsed
+
+            if update_task is None:
+                result = update_controller(controller, elapsed, building.elevators, building.floors, state)
+                if not inspect.isawaitable(result):
+                    _add_message(building, 'Ctr', elapsed, result)
+                elif policy == BLOCK:
+                    _add_message(building, 'Ctr', elapsed, await result)
+                else:
+                    update_task = asyncio.ensure_future(result)
+            if update_task is not None and update_task.done():
+                task, update_task = update_task, None
+                _add_message(building, 'Ctr', elapsed, task.result())
+
+            building.update_all(elapsed)
+            building.notify_all(elapsed)
+            runs = handler_runs[:]
+            handler_runs.clear()
+            if policy == BLOCK:
+                for origin, run in runs:
+                    _add_message(building, origin, elapsed, await run)
+            else:
+                handler_tasks.extend((origin, asyncio.ensure_future(run)) for (origin, run) in runs)
+
+            # Everybody else gets a turn here, at least once a game second.
+            await asyncio.sleep(0)
+            if handler_tasks:
+                for origin, task in handler_tasks:
+                    if task.done():
+                        _add_message(building, origin, elapsed, task.result())
+                handler_tasks = [(origin, task) for (origin, task) in handler_tasks if not task.done()]
+
+            if after_tick is not None:
+                result = after_tick(elapsed)
+                if inspect.isawaitable(result):
+                    await result
+
+            if stuck.check(elapsed):
+                return Scenario.STUCK, elapsed
+
+            elapsed += 1
+    finally:
+        # Whatever the controller hadn't gotten around to finishing doesn't matter anymore.
+        for task in [update_task] + [task for (_, task) in handler_tasks]:
+            if task is not None:
+                task.cancel()
+
+
+def simulate_async_headless(scenario, building, controller, force_duration=None, policy=BLOCK):
+    """game.simulate_headless(), for async controllers: runs async_game_loop() to the end and returns the score."""
+    _, elapsed = asyncio.run(async_game_loop(scenario, building, controller, force_duration=force_duration,
+                                             policy=policy))
+    return building.score(elapsed)
+
+
+def _add_message(building, origin, elapsed, msg):
+    if msg is not None:
+        building.add_message(origin, elapsed, msg)
+
+
+def _origin(source):
+    """The origin that Building.notify_all() would give a message from this elevator or floor."""
+    return f'Ev{source.number}' if isinstance(source, Elevator) else f'F{source.number}'
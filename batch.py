@@ -0,0 +1,199 @@
+#!/usr/local/bin/python
+import argparse
+import collections
+import concurrent.futures
+import functools
+import itertools
+import json
+import os
+import random
+import statistics
+
+from budget import TimeBudget
+from building import Building
+from cache import ResultCache, cache_key
+from game import (default_scenarios, import_scenarios, load_controller_class, scenario_pairs_in_source_order,
+                  simulate_headless)
+from metrics import MetricsCollector, RunMetrics
+
+BatchCell = collections.namedtuple('BatchCell', ('controller', 'scenario', 'seed', 'elevators', 'floors', 'duration',
+                                                 'tick_budget', 'run_budget', 'budget_policy'))
+
+SCORE_COLUMNS = ('finished_rides', 'unfinished_rides', 'average_wait', 'average_trip', 'trip_efficiency')
+# With a time budget, the table also gets these (see budget.TimeBudget).
+BUDGET_COLUMNS = ('controller_seconds', 'missed_ticks', 'budget_overrun')
+# Real-world seconds, which get averaged to more decimal places.
+SECONDS_COLUMNS = ('controller_seconds', 'budget_overrun')
+# With metrics, the table also gets these: percentiles of waits over all of a row's runs.
+METRICS_COLUMNS = ('p95_wait', 'p99_wait')
+
+
+def run_cell(cell, metrics=False):
+    """Simulate one cell of a batch (in whatever process the pool hands it to) and return its score, along with the
+    cell itself so that results can be matched up with their inputs. With metrics, the score also has the run's
+    metrics.RunMetrics, as a dict, under 'metrics'."""
+    random.seed(cell.seed)
+    controller_class = load_controller_class(cell.controller)
+    building = Building(elevator_count=cell.elevators, floor_count=cell.floors, message_width=0, name=cell.scenario,
+                        message_limit=0)
+    controller = controller_class(building.elevators, building.floors)
+    if cell.tick_budget is not None or cell.run_budget is not None:
+        controller = TimeBudget(controller, building, per_tick=cell.tick_budget, per_run=cell.run_budget,
+                                policy=cell.budget_policy)
+    scenario = import_scenarios()[cell.scenario](building)
+    if not metrics:
+        return cell, simulate_headless(scenario, building, controller, force_duration=cell.duration)
+    collector = MetricsCollector(building)
+    score = simulate_headless(scenario, building, controller, force_duration=cell.duration,
+                              after_tick=collector.sample)
+    score['metrics'] = collector.finish().to_dict()
+    return cell, score
+
+
+def run_batch(cells, jobs=None, cache=None, rerun=False, metrics=False):
+    """Spread the cells across a pool of worker processes (one per core unless jobs says otherwise) and return a
+    list of (cell, score) pairs in the same order as the cells. If a cache.ResultCache is given, cells whose scores
+    it has aren't simulated again (unless rerun is true), and the scores of the rest go into it. Cells with a time
+    budget are always simulated, and never cached, since their scores depend on how fast they happen to run. With
+    metrics, the scores include metrics (see run_cell())."""
+    scores = {}
+    keys = {}
+    if cache is not None:
+        scenarios = import_scenarios()
+        keys = {cell: cell_key(cell, scenarios[cell.scenario], metrics=metrics) for cell in cells
+                if cell.tick_budget is None and cell.run_budget is None}
+        for cell in ([] if rerun else keys):
+            score = cache.get(keys[cell])
+            if score is not None:
+                scores[cell] = score
+    misses = [cell for cell in cells if cell not in scores]
+    if misses:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            chunksize = max(1, len(misses) // (4 * (jobs or os.cpu_count() or 1)))
+            for cell, score in pool.map(functools.partial(run_cell, metrics=metrics), misses, chunksize=chunksize):
+                scores[cell] = score
+                if cell in keys:
+                    cache.put(keys[cell], score)
+    return [(cell, scores[cell]) for cell in cells]
+
+
+def cell_key(cell, scenario_class, metrics=False):
+    """The cell's key in a cache.ResultCache; without metrics, the same one run.py uses for the same run."""
+    settings = {'metrics': True} if metrics else {}
+    return cache_key(f'{cell.controller}_controller', scenario_class, seed=cell.seed, elevators=cell.elevators,
+                     floors=cell.floors, duration=cell.duration, tick_budget=cell.tick_budget,
+                     run_budget=cell.run_budget, budget_policy=cell.budget_policy, speeds=None, remote=False,
+                     **settings)
+
+
+def make_cells(controllers, scenarios, seeds, elevator_counts, floor_counts, duration=None, tick_budget=None,
+               run_budget=None, budget_policy=TimeBudget.WARN):
+    """Every combination of the given settings. Budgets are in seconds (see budget.TimeBudget)."""
+    return [BatchCell(c, s, seed, e, f, duration, tick_budget, run_budget, budget_policy) for (c, s, e, f, seed) in
+            itertools.product(controllers, scenarios, elevator_counts, floor_counts, seeds)]
+
+
+def aggregate(results):
+    """Average the scores of runs that differ only by seed. Returns a list of rows (dicts), one per combination of
+    controller, scenario, elevator count and floor count, in the order they first appear in the results. If the
+    scores have metrics, the rows get the METRICS_COLUMNS too, and likewise for the BUDGET_COLUMNS when the
+    controllers had a time budget."""
+    rows = []
+    for (controller, scenario, elevators, floors), scores in _groups(results).items():
+        row = {'controller': controller, 'scenario': scenario, 'elevators': elevators, 'floors': floors,
+               'runs': len(scores)}
+        columns = SCORE_COLUMNS + (BUDGET_COLUMNS if all('controller_seconds' in s for s in scores) else ())
+        for column in columns:
+            row[column] = round(statistics.mean(s[column] for s in scores), 4 if column in SECONDS_COLUMNS else 2)
+        if all('metrics' in s for s in scores):
+            wait = merge_metrics(scores).wait
+            row['p95_wait'] = round(wait.quantile(0.95))
+            row['p99_wait'] = round(wait.quantile(0.99))
+        rows.append(row)
+    return rows
+
+
+def merge_metrics(scores):
+    """One metrics.RunMetrics for all the runs whose scores are given (which need to have metrics)."""
+    merged = None
+    for score in scores:
+        run_metrics = RunMetrics.from_dict(score['metrics'])
+        merged = run_metrics if merged is None else merged.merge(run_metrics)
+    return merged
+
+
+def format_table(rows):
+    columns = ('controller', 'scenario', 'elevators', 'floors', 'runs') + SCORE_COLUMNS
+    if rows and all('controller_seconds' in r for r in rows):
+        columns += BUDGET_COLUMNS
+    if rows and all('p95_wait' in r for r in rows):
+        columns += METRICS_COLUMNS
+    widths = [max([len(c)] + [len(str(r[c])) for r in rows]) for c in columns]
+    lines = ['  '.join(c.rjust(w) for c, w in zip(columns, widths)),
+             '  '.join('-' * w for w in widths)]
+    for r in rows:
+        lines.append('  '.join(str(r[c]).rjust(w) for c, w in zip(columns, widths)))
+    return '\n'.join(lines)
+
+
+def _groups(results):
+    groups = collections.OrderedDict()
+    for cell, score in results:
+        key = (cell.controller, cell.scenario, cell.elevators, cell.floors)
+        groups.setdefault(key, []).append(score)
+    return groups
+
+
+def int_list(text):
+    return [int(n) for n in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run many headless simulations in parallel and tabulate the scores')
+    parser.add_argument('controllers', type=str, nargs='+', help='controller file name prefixes, as for run.py')
+    parser.add_argument('--budget-policy', choices=TimeBudget.POLICIES, default=TimeBudget.WARN,
+                        help='what to do when a controller goes over its time budget (as for run.py)')
+    parser.add_argument('--duration', type=int, nargs='?', help='force the game to simulate this many seconds')
+    parser.add_argument('--elevators', type=int_list, default=[3], help='comma-separated elevator counts')
+    parser.add_argument('--floors', type=int_list, default=[5], help='comma-separated building heights')
+    parser.add_argument('--jobs', type=int, help='number of worker processes (default: one per core)')
+    parser.add_argument('--json', type=str, help='also save the score of every single run to this file')
+    parser.add_argument('--only', type=str,
+                        help='comma-separated names of scenarios to run (default: all but the traffic scenarios)')
+    parser.add_argument('--rerun', action='store_true',
+                        help="simulate every run, even those whose scores are cached (there's no caching at all "
+                             "with --no-cache)")
+    parser.add_argument('--metrics', type=str,
+                        help='also collect metrics (wait and trip time percentiles, queue lengths and elevator '
+                             'statuses over time) and save them, merged over the seeds, to this JSON file')
+    parser.add_argument('--no-cache', action='store_true', help="don't look for cached scores or save new ones")
+    parser.add_argument('--run-budget', type=float,
+                        help='real-world seconds a controller may spend over a whole scenario')
+    parser.add_argument('--seeds', type=int, default=10, help='run each combination with seeds 0 through N-1')
+    parser.add_argument('--tick-budget', type=float,
+                        help='real-world milliseconds a controller may spend in any one game second')
+
+    args = parser.parse_args()
+    scenarios = import_scenarios()
+    if args.only:
+        scenarios = {nm: scenarios[nm] for nm in args.only.split(',')}
+    else:
+        scenarios = default_scenarios()
+    scenario_names = [nm for (nm, _) in scenario_pairs_in_source_order(scenarios)]
+
+    cells = make_cells(args.controllers, scenario_names, range(args.seeds), args.elevators, args.floors,
+                       duration=args.duration, run_budget=args.run_budget, budget_policy=args.budget_policy,
+                       tick_budget=(None if args.tick_budget is None else args.tick_budget / 1000))
+    cache = None if args.no_cache else ResultCache()
+    results = run_batch(cells, jobs=args.jobs, cache=cache, rerun=args.rerun, metrics=bool(args.metrics))
+    print(format_table(aggregate(results)))
+
+    if args.metrics:
+        with open(args.metrics, 'wt') as f:
+            json.dump([{'controller': controller, 'scenario': scenario, 'elevators': elevators, 'floors': floors,
+                        **merge_metrics(scores).to_dict()} for ((controller, scenario, elevators, floors), scores)
+                       in _groups(results).items()], f)
+
+    if args.json:
+        with open(args.json, 'wt') as f:
+            json.dump([dict(cell._asdict(), **score) for cell, score in results], f, indent=2)
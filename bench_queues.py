@@ -0,0 +1,92 @@
+#!/usr/local/bin/python
+"""How much does a boarding or disembarking stop cost as riders pile up? Each stop here moves just one rider, while
+hundreds or thousands of others wait on the floor (going the other way) or ride the elevator (to other floors). The
+"scan" columns time the way Floor and Elevator used to do it, filtering every rider at every stop; the "queued"
+columns time the real Floor and Elevator, which keep riders in per-direction and per-destination queues."""
+import argparse
+import time
+
+from building import Building
+from elevator import Elevator
+from floor import Floor
+from rider import Rider
+
+
+def scan_disembark(riding, floor_num):
+    leaving = [r for r in riding if r.destination_floor_num == floor_num]
+    staying = [r for r in riding if r.destination_floor_num != floor_num]
+    return leaving, staying
+
+
+def scan_pick_up(waiting, going_up):
+    leaving = [r for r in waiting if
+               (going_up and r.start_floor_num < r.destination_floor_num) or
+               (not going_up and r.start_floor_num > r.destination_floor_num)]
+    staying = [r for r in waiting if
+               (going_up and r.start_floor_num > r.destination_floor_num) or
+               (not going_up and r.start_floor_num < r.destination_floor_num)]
+    return leaving, staying
+
+
+def time_boarding(load, stops):
+    crowd = [Rider(1, 0) for _ in range(load)]
+    rider = Rider(1, 2)
+
+    waiting = list(crowd)
+    started = time.perf_counter()
+    for _ in range(stops):
+        waiting.append(rider)
+        _, waiting = scan_pick_up(waiting, True)
+    scan = time.perf_counter() - started
+
+    floor = Floor(1)
+    for r in crowd:
+        floor.add_waiting_rider(r)
+    floor.notify_pending()
+    started = time.perf_counter()
+    for _ in range(stops):
+        floor.riders_waiting_up.append(rider)
+        floor.pick_up_riders(True)
+    queued = time.perf_counter() - started
+    return scan / stops, queued / stops
+
+
+def time_disembarking(load, stops, floor_count=50):
+    building = Building(elevator_count=1, floor_count=floor_count, message_width=0)
+    crowd = [Rider(0, 2 + n % (floor_count - 2)) for n in range(load)]
+    rider = Rider(0, 1)
+
+    riding = list(crowd)
+    started = time.perf_counter()
+    for _ in range(stops):
+        riding.append(rider)
+        _, riding = scan_disembark(riding, 1)
+    scan = time.perf_counter() - started
+
+    # The building retires the riders who get off, so they have to be ones it knows about (and each one can only
+    # finish its trip once).
+    leaving = [building.new_rider(0, 1, 0) for _ in range(stops)]
+    for r in leaving:
+        r.started_waiting = r.trip_start = 0
+    elevator = Elevator(0, starting_floor_num=1)
+    elevator.riders_boarded(crowd)
+    elevator.notify_pending()
+    started = time.perf_counter()
+    for r in leaving:
+        elevator.riders_boarded([r])
+        elevator._disgorge_riders(building, 1)
+    queued = time.perf_counter() - started
+    return scan / stops, queued / stops
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stops', type=int, default=200, help='number of stops to time at each load')
+    args = parser.parse_args()
+
+    print(' riders |  boarding: scan   queued |  disembarking: scan   queued')
+    for load in (10, 100, 1000, 10000):
+        board_scan, board_queued = time_boarding(load, args.stops)
+        off_scan, off_queued = time_disembarking(load, args.stops)
+        print(f'{load:7} | {board_scan * 1e6:13.1f}us {board_queued * 1e6:6.1f}us |'
+              f' {off_scan * 1e6:17.1f}us {off_queued * 1e6:6.1f}us')
@@ -0,0 +1,185 @@
+#!/usr/local/bin/python
+"""Measure how fast the simulator runs. Every combination of controller, building size and rider load gets simulated
+headlessly, with the same riders every time, and we report simulated seconds (ticks) and riders per real second,
+how much of the time went to the controller (its update() and its event handlers) versus the simulation itself, and
+peak memory use. Results can be saved as JSON and compared against a saved baseline."""
+import argparse
+import datetime
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from building import Building
+from game import game_loop, load_controller_class
+from scenarios import Scenario
+
+
+class SteadyLoad(Scenario):
+    """Riders show up at random (but reproducibly) at a steady average rate, going between random floors, for the
+    whole duration of the benchmark."""
+
+    def __init__(self, building, riders_per_minute, duration, seed=0):
+        super().__init__()
+        self.max_duration = duration
+        self.riders_started = 0
+        rng = random.Random(seed)
+        floor_count = len(building.floors)
+        self._schedule = []
+        elapsed = rng.expovariate(riders_per_minute / 60)
+        while elapsed < duration:
+            start, end = rng.sample(range(floor_count), 2)
+            self._schedule.append((int(elapsed), start, end))
+            elapsed += rng.expovariate(riders_per_minute / 60)
+        self._schedule.reverse()
+
+    def next_update(self, elapsed):
+        return self._schedule[-1][0] if self._schedule else None
+
+    def update(self, elapsed, building):
+        while self._schedule and self._schedule[-1][0] <= elapsed:
+            _, start, end = self._schedule.pop()
+            rider = building.new_rider(start, end, elapsed)
+            rider.started_waiting = elapsed
+            self.riders_started += 1
+
+
+class ControllerClock:
+    """Keeps track of the time spent in a controller's update() and in its event handlers."""
+
+    def __init__(self, controller):
+        self.STATE_VIEW = getattr(controller, 'STATE_VIEW', False)
+        self.seconds = 0
+        self._controller = controller
+
+    def update(self, elapsed, elevators, floors, **state):
+        started = time.perf_counter()
+        try:
+            return self._controller.update(elapsed, elevators, floors, **state)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def wrap_handler(self, _, handler):
+        def timed_handler(*args):
+            started = time.perf_counter()
+            try:
+                return handler(*args)
+            finally:
+                self.seconds += time.perf_counter() - started
+        return timed_handler
+
+
+def run_cell(controller_name, floors, elevators, riders_per_minute, duration, measure_memory):
+    building = Building(elevator_count=elevators, floor_count=floors, message_width=0, message_limit=0)
+    scenario = SteadyLoad(building, riders_per_minute, duration)
+    controller = load_controller_class(controller_name)(building.elevators, building.floors)
+    clock = ControllerClock(controller)
+    for source in building.elevators + building.floors:
+        source.wrap_handlers(clock.wrap_handler)
+
+    if measure_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    _, elapsed = game_loop(scenario, building, clock, force_duration=duration)
+    seconds = time.perf_counter() - started
+    peak_memory = None
+    if measure_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, scenario.riders_started, seconds, clock.seconds, peak_memory
+
+
+def benchmark(controllers, floor_counts, elevator_counts, loads, duration, repeat=3):
+    """Returns one result dict per combination. Times are the best of `repeat` runs; memory is measured on a
+    separate run, because tracing allocations slows everything down."""
+    results = []
+    cells = itertools.product(controllers, floor_counts, elevator_counts, loads)
+    for controller_name, floors, elevators, load in cells:
+        runs = [run_cell(controller_name, floors, elevators, load, duration, False) for _ in range(repeat)]
+        ticks, riders, seconds, controller_seconds, _ = min(runs, key=lambda r: r[2])
+        *_, peak_memory = run_cell(controller_name, floors, elevators, load, duration, True)
+        results.append({
+            'controller': controller_name,
+            'floors': floors,
+            'elevators': elevators,
+            'riders_per_minute': load,
+            'ticks': ticks,
+            'riders': riders,
+            'seconds': round(seconds, 4),
+            'ticks_per_second': round(ticks / seconds),
+            'riders_per_second': round(riders / seconds),
+            'controller_share': round(controller_seconds / seconds, 3),
+            'simulator_share': round(1 - controller_seconds / seconds, 3),
+            'peak_memory_kb': round(peak_memory / 1024),
+        })
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns a list of complaints about results that got worse than the baseline by more than `threshold` (a
+    fraction, so 0.1 is ten percent): slower ticks or bigger peak memory."""
+    def key(r):
+        return r['controller'], r['floors'], r['elevators'], r['riders_per_minute']
+
+    before = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        if r['ticks_per_second'] < old['ticks_per_second'] * (1 - threshold):
+            regressions.append(f'{key(r)}: {r["ticks_per_second"]} ticks/s, down from {old["ticks_per_second"]}')
+        if r['peak_memory_kb'] > old['peak_memory_kb'] * (1 + threshold):
+            regressions.append(f'{key(r)}: peak memory {r["peak_memory_kb"]} KB, up from {old["peak_memory_kb"]}')
+    return regressions
+
+
+def int_list(text):
+    return [int(n) for n in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('controllers', type=str, nargs='*', default=['dumb'],
+                        help='controller file name prefixes, as for run.py (default: dumb)')
+    parser.add_argument('--baseline', type=str, help='compare against results saved earlier with --save')
+    parser.add_argument('--duration', type=int, default=3600, help='simulated seconds per run')
+    parser.add_argument('--elevators', type=int_list, default=[1, 4], help='comma-separated elevator counts')
+    parser.add_argument('--floors', type=int_list, default=[5, 20], help='comma-separated building heights')
+    parser.add_argument('--loads', type=int_list, default=[2, 20], help='comma-separated riders per minute')
+    parser.add_argument('--repeat', type=int, default=3, help='time each combination this many times, keep the best')
+    parser.add_argument('--save', type=str, help='save the results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='with --baseline, flag anything that got worse by more than this fraction')
+    args = parser.parse_args()
+
+    results = benchmark(args.controllers, args.floors, args.elevators, args.loads, args.duration, repeat=args.repeat)
+
+    columns = ('controller', 'floors', 'elevators', 'riders_per_minute', 'ticks_per_second', 'riders_per_second',
+               'controller_share', 'peak_memory_kb')
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print('  '.join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in results:
+        print('  '.join(str(r[c]).rjust(w) for c, w in zip(columns, widths)))
+
+    if args.save:
+        with open(args.save, 'wt') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'duration': args.duration,
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'rt') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print()
+            print('REGRESSIONS:')
+            print('\n'.join(regressions))
+            sys.exit(1)
@@ -0,0 +1,111 @@
+import time
+
+from errors import DeadlineMissed
+
+
+class TimeBudget:
+    """Stands in for a controller, keeping track of the real-world time it spends in update() and in its event
+    handlers, and holding it to a budget: at most per_tick seconds in any one game second, and at most per_run
+    seconds over the whole game (either can be None, for no limit). The time used gets added to the building's
+    score as controller_seconds, the number of game seconds in which the controller went over its per-second budget
+    as missed_ticks, and the time it spent over either budget as budget_overrun. (Only a budgeted controller's
+    score has these.)
+
+    What happens when the controller goes over budget depends on the policy:
+    - WARN: nothing, except for a message saying so.
+    - SKIP: the controller misses its turns until it's back within budget: the rest of that game second, plus as much
+      of the seconds after it as it went over by (or, for the per-run budget, the rest of the game). Elevators
+      keep doing whatever they were last told in the meantime, and events that happen while the controller is
+      being skipped are lost on it.
+    - FAIL: DeadlineMissed gets raised, ending the game. (If the controller raises an exception of its own, that
+      gets raised instead, however long it took.)"""
+
+    WARN = 'warn'
+    SKIP = 'skip'
+    FAIL = 'fail'
+    POLICIES = (WARN, SKIP, FAIL)
+
+    def __init__(self, controller, building, per_tick=None, per_run=None, policy=WARN):
+        if policy not in self.POLICIES:
+            raise ValueError(f'unknown policy "{policy}"; should be one of {", ".join(self.POLICIES)}')
+        self.missed_ticks = 0
+        self._building = building
+        self._controller = controller
+        self._elapsed = 0
+        self._per_run = per_run
+        self._per_tick = per_tick
+        self._policy = policy
+        self._run_used = 0
+        self._run_warned = False
+        self._tick_missed = False
+        self._tick_used = 0
+        # So that the score has the budget figures even if the controller never gets to run.
+        building.add_controller_time(0)
+        for source in building.elevators + building.floors:
+            source.wrap_handlers(self._budgeted_handler)
+
+    def __getattr__(self, name):
+        # Anything else (like next_update) is the controller's business.
+        return getattr(self._controller, name)
+
+    def begin_second(self, elapsed):
+        """The game loops call this at the start of every game second they play."""
+        self._elapsed = elapsed
+        self._tick_missed = False
+        if self._policy == self.SKIP and self._per_tick is not None:
+            # Time borrowed from this second, by going over budget in the last one, has to be paid back.
+            self._tick_used = max(0, self._tick_used - self._per_tick)
+        else:
+            self._tick_used = 0
+
+    def update(self, elapsed, elevators, floors, **state):
+        # (state is a state.StateView, for controllers that ask for one.)
+        return self._call(self._controller.update, elapsed, elevators, floors, **state)
+
+    def _budgeted_handler(self, _, handler):
+        def budgeted(*args):
+            return self._call(handler, *args)
+        return budgeted
+
+    def _call(self, f, *args, **kwargs):
+        if self._policy == self.SKIP and self._out_of_time():
+            return None
+        started = time.perf_counter()
+        try:
+            result = f(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            self._tick_used += seconds
+            self._run_used += seconds
+            self._building.add_controller_time(seconds)
+        self._check(seconds)
+        return result
+
+    def _check(self, seconds):
+        """See whether the last `seconds` the controller spent put it over budget."""
+        overrun = 0
+        if self._per_tick is not None and self._tick_used > self._per_tick:
+            overrun = min(seconds, self._tick_used - self._per_tick)
+        if self._per_run is not None and self._run_used > self._per_run:
+            overrun = max(overrun, min(seconds, self._run_used - self._per_run))
+        missed_tick = self._per_tick is not None and self._tick_used > self._per_tick and not self._tick_missed
+        if overrun > 0 or missed_tick:
+            self._building.add_budget_overrun(overrun, missed_tick)
+        if self._per_tick is not None and self._tick_used > self._per_tick and not self._tick_missed:
+            self._tick_missed = True
+            self.missed_ticks += 1
+            self._missed(f'controller took {self._tick_used * 1000:.3f} ms in second {self._elapsed}; '
+                         f'its budget is {self._per_tick * 1000:.3f} ms per second')
+        if self._per_run is not None and self._run_used > self._per_run and not self._run_warned:
+            self._run_warned = True
+            self._missed(f'controller has taken {self._run_used:.3f} seconds so far; '
+                         f'its budget is {self._per_run:.3f} seconds per game')
+
+    def _missed(self, explanation):
+        if self._policy == self.FAIL:
+            raise DeadlineMissed(explanation)
+        self._building.add_message('Bgt', self._elapsed, explanation)
+
+    def _out_of_time(self):
+        return ((self._per_tick is not None and self._tick_used >= self._per_tick) or
+                (self._per_run is not None and self._run_used >= self._per_run))
@@ -1,5 +1,6 @@
+import collections
+import fractions
 import math
-import statistics
 
 from elevator import Elevator
 from floor import Floor
@@ -13,68 +14,178 @@ class Building:
     DRAW_MESSAGES_PREFIX = len('001 EV1 ')
     DRAW_WAITING_RIDERS_WIDTH = 10
 
+    # How many of the latest messages are kept, unless the building's given a message_limit of its own.
+    MESSAGE_LIMIT = 1000
+
     RIDER_WAITING = 0
 
-    def __init__(self, elevator_count, floor_count, message_width, name='Building', trace_riders=False):
-        self.elevators = [Elevator(n) for n in range(elevator_count)]
+    def __init__(self, elevator_count, floor_count, message_width, name='Building', trace_riders=False,
+                 message_limit=MESSAGE_LIMIT, message_log=None, speeds=None):
+        # speeds, if given, has an elevator.SpeedProfile (or None, for the standard speed) for each elevator.
+        if speeds is None:
+            speeds = [None] * elevator_count
+        elif len(speeds) != elevator_count:
+            raise ValueError(f'{len(speeds)} speeds given for {elevator_count} elevators')
+        self.elevators = [Elevator(n, speed=speed) for (n, speed) in zip(range(elevator_count), speeds)]
         self.floors = [Floor(0, has_down_button=False)]
         self.floors.extend(Floor(n) for n in range(floor_count)[1:-1])
         self.floors.append(Floor(floor_count - 1, has_up_botton=False))
-        self._all_riders = []
+        # Riders who haven't finished their trips yet, by number. Finished riders are folded into the totals below
+        # and forgotten, so long simulations don't pile up riders.
+        self._active_riders = {}
+        self._budget_overrun = 0
+        # None until something times the controller (see add_controller_time()).
+        self._controller_seconds = None
+        self._finished_distance = 0
+        self._finished_rides = 0
+        self._finished_trip_time = 0
+        self._finished_wait = 0
+        self._finished_weighted_efficiency = 0
+        # Forks (see fork()) share riders with the building they came from, until they need to change one.
+        self._is_fork = False
+        self._riders_to_notify = []
+        # Messages are kept as (elapsed, origin, message) and only formatted when they're drawn or printed. Only
+        # the message_limit most recent ones are kept (all of them if it's None). Every message also gets written
+        # to the message_log file, if there is one.
+        self._message_listeners = []
+        self._message_log = message_log
         self._message_width = message_width
-        self._messages = []
+        self._messages = collections.deque(maxlen=message_limit)
+        self._missed_ticks = 0
         self._name = name
+        self._ride_listeners = []
+        self._rider_listeners = []
         self._trace_riders = trace_riders
 
     @property
     def all_messages(self):
-        return self._messages
+        return [self._format_message(m)[:self._message_width] for m in self._messages]
+
+    @property
+    def name(self):
+        return self._name
+
+    def add_controller_time(self, seconds):
+        """Count some real-world time spent by the controller toward its score. (budget.TimeBudget does this.) Until
+        something does, the score leaves out controller_seconds and the other budget figures, since nobody was
+        keeping track."""
+        self._controller_seconds = (self._controller_seconds or 0) + seconds
+
+    def add_budget_overrun(self, seconds, missed_tick):
+        """Count time the controller spent over its budget toward its score, along with the game second it missed
+        the deadline for, if this made it miss one. (budget.TimeBudget does this too.)"""
+        self._budget_overrun += seconds
+        if missed_tick:
+            self._missed_ticks += 1
 
     def add_message(self, origin, elapsed, msg):
+        """The message can also be a function that returns the message, if it's expensive to put together and might
+        never be seen."""
         assert len(origin) <= 3
-        self._messages.append(f'{str(elapsed).rjust(3)} {origin.ljust(3)} {msg}'[:self._message_width])
+        message = (elapsed, origin, msg)
+        self._messages.append(message)
+        if self._message_log is not None:
+            self._message_log.write(self._format_message(message))
+            self._message_log.write('\n')
+        for listener in self._message_listeners:
+            listener(message)
 
-    def draw(self, elapsed):
-        elevators_width = (self.DRAW_MAX_ELEVATOR_WIDTH + 5) * len(self.elevators)
-        total_width = self.DRAW_LEFT_MARGIN_WIDTH + elevators_width + self.DRAW_WAITING_RIDERS_WIDTH
-        height = 2 * len(self.floors) + 2
+    def add_message_listener(self, listener):
+        """Have listener(message) called with every message, as an (elapsed, origin, message) tuple, whether or not
+        the building keeps it. The message part can be a function; see add_message()."""
+        self._message_listeners.append(listener)
+
+    def add_ride_listener(self, listener):
+        """Have listener(riders, elevator, elapsed) called whenever riders get on an elevator, and
+        listener(riders, None, elapsed) whenever they get off one (at their destination). Like add_rider_listener(),
+        this is for the simulation's own tools."""
+        self._ride_listeners.append(listener)
 
+    def add_rider_listener(self, listener):
+        """Have listener(rider, elapsed) called whenever a new rider shows up. (This is for the simulation's own
+        tools, like trace recording; controllers aren't supposed to know about riders before they press a button.)"""
+        self._rider_listeners.append(listener)
+
+    def draw(self, elapsed):
+        rows = self.frame(elapsed)
         if elapsed > 0:
             # redraw (move cursor back up to top-left corner of building)
-            print('\033[F' + ('\033[A' * (height - 1)), end='')
+            print('\033[F' + ('\033[A' * (len(rows) - 1)), end='')
+        print('\n'.join(rows))
+
+    def fork(self):
+        """A copy of the building, as it is right now, to try things out on: tell its elevators what to do, run it
+        forward (see lookahead.py), and see how the score turns out, without touching the real thing. Forks are
+        cheap, because riders aren't copied until the fork changes them, and they come without event handlers,
+        messages, or anything else from outside the building itself."""
+        twin = object.__new__(Building)
+        twin.__dict__.update(self.__dict__)
+        twin.elevators = [e.fork() for e in self.elevators]
+        twin.floors = [f.fork() for f in self.floors]
+        twin._active_riders = dict(self._active_riders)
+        twin._is_fork = True
+        twin._message_log = None
+        twin._message_listeners = []
+        twin._messages = collections.deque(maxlen=0)
+        twin._ride_listeners = []
+        twin._rider_listeners = []
+        twin._riders_to_notify = []
+        twin._trace_riders = False
+        return twin
 
-        self._draw_marquee(self._name, total_width)
-        self._draw_elevator_headings(self.DRAW_LEFT_MARGIN_WIDTH)
+    def frame(self, elapsed):
+        """The picture of the building that draw() prints, as a list of lines of text (with no newlines)."""
+        elevators_width = (self.DRAW_MAX_ELEVATOR_WIDTH + 5) * len(self.elevators)
+        total_width = self.DRAW_LEFT_MARGIN_WIDTH + elevators_width + self.DRAW_WAITING_RIDERS_WIDTH
 
+        rows = [self._marquee_row(self._name, total_width), self._elevator_headings_row(self.DRAW_LEFT_MARGIN_WIDTH)]
         for floor in reversed(self.floors):
-            self._draw_floor(floor.number, len(floor.riders_waiting))
+            rows.append(self._floor_row(floor.number, floor.waiting_count))
             if floor.number > 0:
                 # space in between floors, where elevator is shown in transit
-                self._draw_floor(floor.number - 0.5, 0)
-
-        self._draw_marquee(f'{elapsed} seconds', total_width)
+                rows.append(self._floor_row(floor.number - 0.5, 0))
+        rows.append(self._marquee_row(f'{elapsed} seconds', total_width))
+        return rows
 
     def elevator_expel_riders(self, riders, elapsed):
         assert len(riders) > 0
+        if self._is_fork:
+            riders = [r.copy() for r in riders]
         for r in riders:
             r.add_pending_event('reached_destination')
             r.trip_end = elapsed
+            self._retire_rider(r)
+        self._riders_to_notify.extend(riders)
+        for listener in self._ride_listeners:
+            listener(riders, None, elapsed)
         if self._trace_riders:
-            numbers = 'R' + ',R'.join(str(r.number) for r in riders)
+            numbers = [r.number for r in riders]
+            floor_num = riders[0].destination_floor_num
             self.add_message('RDR', elapsed,
-                             f'riders {numbers} disembarking on floor {riders[0].destination_floor_num}')
+                             lambda: f'riders {_rider_names(numbers)} disembarking on floor {floor_num}')
 
     def elevator_take_in_riders(self, elevator, going_up, elapsed):
         boarding = self.floors[elevator.floor_num].pick_up_riders(going_up)
         if len(boarding) == 0:
             return
+        if self._is_fork:
+            boarding = [r.copy() for r in boarding]
+            for r in boarding:
+                self._active_riders[r.number] = r
         for r in boarding:
             r.trip_start = elapsed
         elevator.riders_boarded(boarding)
+        for listener in self._ride_listeners:
+            listener(boarding, elevator, elapsed)
         if self._trace_riders:
-            numbers = 'R' + ',R'.join(str(r.number) for r in boarding)
+            numbers = [r.number for r in boarding]
+            elevator_num, floor_num = elevator.number, elevator.floor_num
             self.add_message('RDR', elapsed,
-                             f'riders {numbers} boarding Ev{elevator.number} on floor {elevator.floor_num}')
+                             lambda: f'riders {_rider_names(numbers)} boarding Ev{elevator_num} on floor {floor_num}')
+
+    def has_active_riders(self):
+        """Is anybody waiting for an elevator or riding in one?"""
+        return len(self._active_riders) > 0
 
     def new_rider(self, start_floor_num, destination_floor_num, elapsed):
         if not (0 <= start_floor_num < len(self.floors) and 0 <= destination_floor_num < len(self.floors)):
@@ -83,8 +194,10 @@ class Building:
         if start_floor_num == destination_floor_num:
             raise ValueError(f'scenario wanted ride from floor {start_floor_num} to itself')
         rider = Rider(start_floor_num, destination_floor_num)
-        self._all_riders.append(rider)
+        self._active_riders[rider.number] = rider
         self.floors[start_floor_num].add_waiting_rider(rider)
+        for listener in self._rider_listeners:
+            listener(rider, elapsed)
         if self._trace_riders:
             self.add_message(
                 'RDR',
@@ -104,38 +217,38 @@ class Building:
                 self.add_message(f'Ev{i}', elapsed, m)
 
     def score(self, total_elapsed):
-        waits = []
-        for r in self._all_riders:
-            waits.append((total_elapsed if r.trip_start is None else r.trip_start) - r.started_waiting)
-
-        trip_efficiencies = []
-        satisfied = [r for r in self._all_riders if r.trip_end is not None]
-        trip_distances = [abs(r.start_floor_num - r.destination_floor_num) for r in satisfied]
-        sum_of_distances = sum(trip_distances)
-        for i, r in enumerate(satisfied):
-            optimal = Elevator.calculate_optimal_trip(r.start_floor_num, r.destination_floor_num)
-            base_efficiency = optimal / (r.trip_end - r.trip_start)
-            trip_efficiencies.append(base_efficiency * trip_distances[i] / sum_of_distances)
-
-        if len(trip_efficiencies) == 0:
+        total_wait = self._finished_wait
+        for r in self._active_riders.values():
+            total_wait += (total_elapsed if r.trip_start is None else r.trip_start) - r.started_waiting
+
+        if self._finished_rides == 0:
             mean_trip_efficiency = 0
         else:
-            mean_trip_efficiency = statistics.mean(trip_efficiencies)
+            # Each trip's efficiency counts in proportion to its share of the total distance traveled.
+            mean_trip_efficiency = self._finished_weighted_efficiency / self._finished_distance / self._finished_rides
 
-        return {
-            'finished_rides': len(satisfied),
-            'unfinished_rides': len([r for r in self._all_riders if r.trip_end is None]),
-            'average_wait': statistics.mean(waits),
+        score = {
+            'finished_rides': self._finished_rides,
+            'unfinished_rides': len(self._active_riders),
+            'average_wait': _mean(total_wait, self._finished_rides + len(self._active_riders)),
+            'average_trip': _mean(self._finished_trip_time, self._finished_rides),
             'trip_efficiency': round(mean_trip_efficiency * 100),
         }
+        if self._controller_seconds is not None:
+            score['controller_seconds'] = round(self._controller_seconds, 4)
+            score['missed_ticks'] = self._missed_ticks
+            score['budget_overrun'] = round(self._budget_overrun, 4)
+        return score
 
     def update_all(self, elapsed):
         for e in self.elevators:
             e.update(elapsed, self)
-        for r in self._all_riders:
-            r.notify_pending()
+        if len(self._riders_to_notify) > 0:
+            riders, self._riders_to_notify = self._riders_to_notify, []
+            for r in riders:
+                r.notify_pending()
 
-    def _draw_elevator(self, elevator, for_floor_num):
+    def _elevator_cell(self, elevator, for_floor_num):
         if isinstance(for_floor_num, int):
             draw_it = (elevator.floor_num == for_floor_num)
         else:
@@ -150,35 +263,66 @@ class Building:
                 elev = f'>{max(" ", "*" * min(elevator.rider_count, 3))}<'.center(self.DRAW_MAX_ELEVATOR_WIDTH)
             else:
                 elev = f'{{{max(" ", "*" * min(elevator.rider_count, 3))}}}'.center(self.DRAW_MAX_ELEVATOR_WIDTH)
-            print(f'| {elev} | ', end='')
+            return f'| {elev} | '
         else:
-            print(f'| {" " * self.DRAW_MAX_ELEVATOR_WIDTH} | ', end='')
+            return f'| {" " * self.DRAW_MAX_ELEVATOR_WIDTH} | '
 
-    def _draw_elevator_headings(self, left_margin):
+    def _elevator_headings_row(self, left_margin):
         headings = '|' + \
                    '| |'.join([f'Elv {n}'.center(self.DRAW_MAX_ELEVATOR_WIDTH + 2) for n in range(len(self.elevators))]) + \
                    '| Waiting'
-        print(' ' * left_margin + headings)
+        return ' ' * left_margin + headings
 
-    def _draw_floor(self, floor_number, how_many_waiting):
+    def _floor_row(self, floor_number, how_many_waiting):
         if int(floor_number) == floor_number:
-            print(f'FLOOR {str(floor_number).rjust(2)}  ', end='')
+            parts = [f'FLOOR {str(floor_number).rjust(2)}  ']
         else:
-            print(' ' * self.DRAW_LEFT_MARGIN_WIDTH, end='')
+            parts = [' ' * self.DRAW_LEFT_MARGIN_WIDTH]
 
         for elevator in self.elevators:
-            self._draw_elevator(elevator, floor_number)
+            parts.append(self._elevator_cell(elevator, floor_number))
 
-        print(('*' * how_many_waiting).ljust(self.DRAW_WAITING_RIDERS_WIDTH, ' '), end='')
+        parts.append(('*' * how_many_waiting).ljust(self.DRAW_WAITING_RIDERS_WIDTH, ' '))
 
         if len(self._messages) > floor_number * 2:
-            msg = self._messages[-(round(floor_number * 2) + 1)]
-            print(msg.ljust(self._message_width + self.DRAW_MESSAGES_PREFIX, ' '))
+            msg = self._format_message(self._messages[-(round(floor_number * 2) + 1)])[:self._message_width]
+            parts.append(msg.ljust(self._message_width + self.DRAW_MESSAGES_PREFIX, ' '))
         else:
-            print(' ' * self._message_width)
+            parts.append(' ' * self._message_width)
+        return ''.join(parts)
+
+    @staticmethod
+    def _format_message(message):
+        elapsed, origin, msg = message
+        if callable(msg):
+            msg = msg()
+        return f'{str(elapsed).rjust(3)} {origin.ljust(3)} {msg}'
 
-    def _draw_marquee(self, marquee, total_width):
+    def _retire_rider(self, rider):
+        del self._active_riders[rider.number]
+        distance = abs(rider.start_floor_num - rider.destination_floor_num)
+        trip_time = rider.trip_end - rider.trip_start
+        self._finished_distance += distance
+        self._finished_rides += 1
+        self._finished_trip_time += trip_time
+        self._finished_wait += rider.trip_start - rider.started_waiting
+        optimal = Elevator.calculate_optimal_trip(rider.start_floor_num, rider.destination_floor_num)
+        self._finished_weighted_efficiency += optimal / trip_time * distance
+
+    def _marquee_row(self, marquee, total_width):
         left_slug_len = int((total_width - len(marquee) - 2) / 2)
-        print('=' * left_slug_len, end='')
-        print(f' {marquee} ', end='')
-        print('=' * (total_width - left_slug_len - len(marquee) - 2))
+        return '=' * left_slug_len + f' {marquee} ' + '=' * (total_width - left_slug_len - len(marquee) - 2)
+
+
+
+def _rider_names(numbers):
+    return 'R' + ',R'.join(str(n) for n in numbers)
+
+
+def _mean(total, count):
+    """The mean of `count` whole numbers adding up to `total`, as statistics.mean() would report it: an int if it
+    comes out even, otherwise a float."""
+    if count == 0:
+        return 0
+    mean = fractions.Fraction(total, count)
+    return mean.numerator if mean.denominator == 1 else float(mean)
@@ -0,0 +1,104 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+# Changing any of these can change a score (or its metrics), so their source goes into every cache key.
+SIMULATOR_MODULES = ('budget', 'building', 'elevator', 'eta', 'events', 'floor', 'game', 'lookahead', 'metrics',
+                     'remote', 'rider', 'scenarios', 'state')
+
+
+class ResultCache:
+    """Scores of past runs, kept on disk so that runs whose inputs haven't changed don't have to be simulated again.
+    Each score is a little JSON file in the cache directory, named for its key (see cache_key()). When the files
+    add up to more than max_bytes, the ones that were used longest ago get deleted."""
+
+    def __init__(self, directory='.score-cache', max_bytes=64 * 1024 * 1024):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._size = None
+
+    def get(self, key):
+        """The score saved under this key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rt') as f:
+                score = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # Remember that it's been used, for eviction's sake. (Another process may have evicted it in the meantime.)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return score
+
+    def put(self, key, score):
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wt') as f:
+            json.dump(score, f)
+        # Written and then renamed, so a cache shared by several processes never has half-written entries.
+        os.replace(temp_path, path)
+        if self._size is None:
+            self._size = sum(size for (_, _, size) in self._entries())
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self._max_bytes:
+            self._evict()
+
+    def _entries(self):
+        """(last used, path, size) for every entry in the cache."""
+        entries = []
+        with os.scandir(self._directory) as scan:
+            for entry in scan:
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """Delete the least recently used entries until the cache is down to three quarters of its maximum size, so
+        that it doesn't have to do this again on the very next put()."""
+        entries = sorted(self._entries())
+        self._size = sum(size for (_, _, size) in entries)
+        for _, path, size in entries:
+            if self._size <= self._max_bytes * 3 / 4:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def _path(self, key):
+        return os.path.join(self._directory, f'{key}.json')
+
+
+def cache_key(controller_module, scenario_class, **settings):
+    """A hash of everything that decides how a run turns out: the source of the controller's module, of the
+    scenario class (and the classes it's built on), of the simulation itself, and the settings (seed, building
+    size, duration and so on). Code that the controller imports from other modules of your own isn't included, so
+    use a forced re-run after changing that."""
+    digest = hashlib.sha256()
+    digest.update(_module_source(controller_module))
+    for clz in scenario_class.__mro__:
+        if clz is not object:
+            digest.update(inspect.getsource(clz).encode())
+    for name in SIMULATOR_MODULES:
+        digest.update(_module_source(name))
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+_module_sources = {}
+
+
+def _module_source(name):
+    if name not in _module_sources:
+        __import__(name)
+        with open(sys.modules[name].__file__, 'rb') as f:
+            _module_sources[name] = f.read()
+    return _module_sources[name]
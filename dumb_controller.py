@@ -32,6 +32,10 @@ class DumbElevatorController:
         an_elevator.on('arrive_at_floor', handle_arrive_at_floor)
         an_elevator.open_doors_and_board_riders(an_elevator['direction'] == 'up')
 
+    def next_update(self, elapsed):
+        """My update function doesn't do anything, so the simulation never needs to call it just for my sake."""
+        return None
+
     def update(self, elapsed, elevators, floors):
         """I will call this function periodically. The elapsed value will contain the number of seconds (in the
         simulation) that have passed since the last time I called this update function."""
@@ -1,4 +1,5 @@
 import collections
+import itertools
 
 from errors import DoorsAreOpen
 from events import EventSource
@@ -16,15 +17,29 @@ class Elevator(EventSource):
     OPENING_DOORS_TO_DISGORGE = 7
     DISGORGING_RIDERS = 8
 
+    # Positions are kept as whole numbers of these units above the ground floor, so they're exact. Any speed that
+    # takes a whole number of seconds per floor, up to 16 (and plenty more), divides into it evenly.
+    UNITS_PER_FLOOR = 720720
+    # How long it takes to go from one floor to the next, at the standard speed (see SpeedProfile).
     SECONDS_BETWEEN_FLOORS = 4
+    # Opening the doors, letting riders on and off, and closing them again takes three seconds.
+    DOOR_CYCLE_SECONDS = 3
 
-    def __init__(self, number, starting_floor_num=0):
+    EVENT_NAMES = ('arrive_at_floor', 'became_idle', 'floor_button_pressed', 'idle')
+
+    def __init__(self, number, starting_floor_num=0, speed=None):
         self.number = number
-        super().__init__(('arrive_at_floor', 'floor_button_pressed', 'idle'))
+        super().__init__()
         self._now_boarding_direction = None
         self._contoller_data = {}
-        self._at_floor_num = starting_floor_num
-        self._riders = []
+        self._speed = SpeedProfile() if speed is None else speed
+        self._place(starting_floor_num * self.UNITS_PER_FLOOR, 0)
+        # Whether 'became_idle' has been fired since the elevator last went idle. Every command clears it, since even
+        # one that gets the elevator nowhere (like go_down on the ground floor) means it's idle all over again.
+        self._idle_announced = False
+        # Riders are bucketed by destination, so letting them off only has to touch the riders who get off.
+        self._rider_count = 0
+        self._riders_by_destination = {}
         self._status = self.IDLE
 
     def __contains__(self, item):
@@ -43,9 +58,18 @@ class Elevator(EventSource):
     def floor_num(self):
         return self._at_floor_num
 
+    @property
+    def position(self):
+        """Where the elevator is, in UNITS_PER_FLOOR units above the ground floor."""
+        return self._position
+
     @property
     def rider_count(self):
-        return len(self._riders)
+        return self._rider_count
+
+    @property
+    def speed(self):
+        return self._speed
 
     @property
     def status(self):
@@ -55,51 +79,118 @@ class Elevator(EventSource):
         """Stop the elevator, open its doors (letting riders on and off) and then close its doors.
         The whole operation wil take three game seconds, and at the end, the elevator will be idle."""
         self._status = self.OPENING_DOORS_TO_BOARD
+        self._idle_announced = False
         self._now_boarding_direction = 'up' if going_up else 'down'
 
     def open_doors_to_disembark(self):
         self._status = self.OPENING_DOORS_TO_DISGORGE
+        self._idle_announced = False
 
     @classmethod
     def calculate_optimal_trip(cls, start, destination):
+        """How long a ride would take if the elevator were waiting for you and went straight there, at the standard
+        speed."""
         dist = abs(destination - start)
-        # 3 seconds for all doors/embarkation time
-        return dist * cls.SECONDS_BETWEEN_FLOORS + 3
+        return dist * cls.SECONDS_BETWEEN_FLOORS + cls.DOOR_CYCLE_SECONDS
+
+    def coast(self, ticks):
+        """Do what `ticks` calls to update() would do, given that coasting_ticks() said none of them would do anything
+        but move the elevator along between floors."""
+        if self._status == self.GOING_UP:
+            self._position += self._step * ticks
+        elif self._status == self.GOING_DOWN:
+            self._position -= self._step * ticks
+        else:
+            return
+        self._at_floor_num = self._position / self.UNITS_PER_FLOOR
+
+    def coasting_ticks(self, building):
+        """How many of the next calls to update() can be skipped over (see coast()) because they won't do anything
+        but move the elevator between floors? None means that the elevator will sit there doing nothing forever
+        (or until a controller tells it to do something)."""
+        if self._status == self.GOING_UP:
+            if self._at_floor_num >= len(building.floors) - 1:
+                return 0
+            return -(-(self.UNITS_PER_FLOOR - self._position % self.UNITS_PER_FLOOR) // self._step) - 1
+        elif self._status == self.GOING_DOWN:
+            if self._at_floor_num <= 0:
+                return 0
+            return -(-((self._position - 1) % self.UNITS_PER_FLOOR + 1) // self._step) - 1
+        elif self._status == self.IDLE:
+            if self.has_handlers('idle') or (not self._idle_announced and self.has_handlers('became_idle')):
+                return 0
+            return None
+        elif self._status == self.STOPPED:
+            return None
+        else:
+            # Door phases change every second.
+            return 0
+
+    def fork(self):
+        """A copy of this elevator for looking ahead (see Building.fork), with its own controller data (copied) but no
+        event handlers."""
+        twin = object.__new__(type(self))
+        twin.__dict__.update(self.__dict__)
+        EventSource.__init__(twin)
+        twin.__dict__.pop('_handler_wrappers', None)
+        twin._contoller_data = dict(self._contoller_data)
+        twin._riders_by_destination = {floor_num: list(riders) for (floor_num, riders) in
+                                       self._riders_by_destination.items()}
+        return twin
 
     def go_down(self):
         if self._status != self.IDLE:
             raise DoorsAreOpen()
         self._status = self.GOING_DOWN
+        self._idle_announced = False
+        self._place(self._position, 0)
 
     def go_up(self):
         if self._status != self.IDLE:
             raise DoorsAreOpen()
         self._status = self.GOING_UP
+        self._idle_announced = False
+        self._place(self._position, 0)
 
     def notify_all(self):
         messages = self.notify_pending()
         if self._status == self.IDLE:
-            msg = self.notify('idle')
-            if len(msg) > 0:
-                messages.extend(msg)
+            if not self._idle_announced:
+                self._idle_announced = True
+                self._dispatch('became_idle', (), messages)
+            self._dispatch('idle', (), messages)
+        else:
+            self._idle_announced = False
         return messages
 
     def riders_boarded(self, riders):
-        self._riders.extend(riders)
+        self._rider_count += len(riders)
         for r in riders:
+            self._riders_by_destination.setdefault(r.destination_floor_num, []).append(r)
             self.add_pending_event('floor_button_pressed', r.destination_floor_num)
 
+    def seconds_until_arrival(self, floor_num):
+        """If the elevator is on its way up or down, and floor_num is ahead of it, how many seconds until it gets
+        there (if it doesn't stop on the way)? Otherwise, None."""
+        if self._status == self.GOING_UP and floor_num > self._at_floor_num:
+            to_next_floor = self.UNITS_PER_FLOOR - self._position % self.UNITS_PER_FLOOR
+            floors_after_next = floor_num - (self._position + to_next_floor) // self.UNITS_PER_FLOOR
+        elif self._status == self.GOING_DOWN and floor_num < self._at_floor_num:
+            to_next_floor = (self._position - 1) % self.UNITS_PER_FLOOR + 1
+            floors_after_next = (self._position - to_next_floor) // self.UNITS_PER_FLOOR - floor_num
+        else:
+            return None
+        return -(-to_next_floor // self._step) + self._speed.run_seconds(floors_after_next, start=self._run_floors + 1)
+
     def update(self, elapsed, building):
-        was_at_floor_num = self._at_floor_num
-        floor_increment = 1 / self.SECONDS_BETWEEN_FLOORS
         if self._status == self.GOING_UP:
             if self._at_floor_num < len(building.floors) - 1:
-                self._at_floor_num += floor_increment
+                self._move(self._step, building)
             else:
                 self._status = self.IDLE
         elif self._status == self.GOING_DOWN:
             if self._at_floor_num > 0:
-                self._at_floor_num -= floor_increment
+                self._move(-self._step, building)
             else:
                 self._status = self.IDLE
         elif self._status == self.OPENING_DOORS_TO_BOARD:
@@ -112,21 +203,81 @@ class Elevator(EventSource):
         elif self._status == self.CLOSING_DOORS:
             self._status = self.IDLE
         elif self._status == self.OPENING_DOORS_TO_DISGORGE:
-            self._status == self.DISGORGING_RIDERS
+            self._status = self.DISGORGING_RIDERS
         elif self._status == self.DISGORGING_RIDERS:
             self._disgorge_riders(building, elapsed)
             self._status = self.CLOSING_DOORS
 
-        # In case floating-point math screws me up…
-        if abs(round(self._at_floor_num) - self._at_floor_num) < 0.01:
-            self._at_floor_num = round(self._at_floor_num)
-
-        if was_at_floor_num != self._at_floor_num and isinstance(self._at_floor_num, int):
-            self._pending_events.append(('arrive_at_floor', building.floors[self._at_floor_num]))
-
     def _disgorge_riders(self, building, elapsed):
-        leaving = [r for r in self._riders if r.destination_floor_num == self._at_floor_num]
-        staying = [r for r in self._riders if r.destination_floor_num != self._at_floor_num]
-        if len(leaving) > 0:
+        leaving = self._riders_by_destination.pop(self._at_floor_num, None)
+        if leaving is not None:
+            self._rider_count -= len(leaving)
             building.elevator_expel_riders(leaving, elapsed)
-        self._riders = staying
+
+    def _move(self, units, building):
+        position = self._position + units
+        # An elevator that set off from between floors (having stopped there with open_doors_to_disembark) isn't
+        # a whole number of steps from the next floor, so it stops short of the last step when it gets there.
+        if units > 0:
+            next_floor = (self._position // self.UNITS_PER_FLOOR + 1) * self.UNITS_PER_FLOOR
+            self._position = min(position, next_floor)
+        else:
+            next_floor = (-(-self._position // self.UNITS_PER_FLOOR) - 1) * self.UNITS_PER_FLOOR
+            self._position = max(position, next_floor)
+        if self._position % self.UNITS_PER_FLOOR == 0:
+            # On to the next floor of the run, which may be faster.
+            self._place(self._position, self._run_floors + 1)
+            self.add_pending_event('arrive_at_floor', building.floors[self._at_floor_num])
+        else:
+            self._at_floor_num = self._position / self.UNITS_PER_FLOOR
+
+    def _place(self, position, run_floors):
+        """Put the elevator at position, on the run_floors'th floor since it set off (which decides its speed)."""
+        self._position = position
+        floor_num, part = divmod(position, self.UNITS_PER_FLOOR)
+        self._at_floor_num = floor_num if part == 0 else position / self.UNITS_PER_FLOOR
+        self._run_floors = run_floors
+        self._step = self.UNITS_PER_FLOOR // self._speed.floor_seconds(run_floors)
+
+
+class SpeedProfile:
+    """How fast an elevator goes. Once it's up to speed, every floor takes seconds_per_floor seconds; to begin with,
+    the first few floors after it sets off may take longer (or, for that matter, shorter), as given by ramp. Either
+    way, every floor takes a whole number of seconds that goes evenly into Elevator.UNITS_PER_FLOOR, so an elevator
+    is always exactly at a floor when it gets there. An express elevator that needs a couple of floors to get going
+    might be SpeedProfile(2, ramp=(4, 3)). Make a building with a mix of them with Building(speeds=...)."""
+
+    def __init__(self, seconds_per_floor=Elevator.SECONDS_BETWEEN_FLOORS, ramp=()):
+        ramp = tuple(ramp)
+        for seconds in (seconds_per_floor,) + ramp:
+            if not isinstance(seconds, int) or seconds < 1 or Elevator.UNITS_PER_FLOOR % seconds != 0:
+                raise ValueError(f'{seconds} seconds per floor is not a whole number that goes evenly into '
+                                 f'{Elevator.UNITS_PER_FLOOR}')
+        self.ramp = ramp
+        self.seconds_per_floor = seconds_per_floor
+        # Seconds to go the first n floors, for n up to len(ramp).
+        self._ramp_seconds = [0] + list(itertools.accumulate(ramp))
+
+    def __eq__(self, other):
+        return (isinstance(other, SpeedProfile) and self.seconds_per_floor == other.seconds_per_floor and
+                self.ramp == other.ramp)
+
+    def __hash__(self):
+        return hash((self.seconds_per_floor, self.ramp))
+
+    def __repr__(self):
+        return f'SpeedProfile({self.seconds_per_floor}, ramp={self.ramp})'
+
+    def floor_seconds(self, n):
+        """How long the nth floor (counting from 0) after setting off takes."""
+        return self.ramp[n] if n < len(self.ramp) else self.seconds_per_floor
+
+    def run_seconds(self, floors, start=0):
+        """How long it takes to go the given number of floors without stopping, starting with the start'th floor
+        after setting off (0 for an elevator that's standing still)."""
+        return self._seconds_to(start + floors) - self._seconds_to(start)
+
+    def _seconds_to(self, n):
+        if n <= len(self.ramp):
+            return self._ramp_seconds[n]
+        return self._ramp_seconds[-1] + (n - len(self.ramp)) * self.seconds_per_floor
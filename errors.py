@@ -9,3 +9,9 @@ class DoorsAreOpen(GameplayError):
 
 class NoSuchButton(Exception):
     pass
+
+class DeadlineMissed(GameplayError):
+    """A controller went over its time budget (see budget.py), under a policy of failing when that happens."""
+
+class ControllerCrashed(GameplayError):
+    """A controller running in its own process (see remote.py) raised an exception or died."""
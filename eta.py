@@ -0,0 +1,105 @@
+import math
+
+from elevator import Elevator
+
+
+class EtaOracle:
+    """Answers "how many seconds until this elevator gets to that floor?" using the simulation's own timing: the
+    elevator's speed (see elevator.SpeedProfile), three seconds for a stop (doors opening, riders getting on and off,
+    doors closing), and whatever the elevator is in the middle of right now. Make one per building, in your
+    controller's __init__ (say), and ask it as often as you like.
+
+    An elevator gets to a floor in the second when its floor_num becomes that floor, which is when arrive_at_floor
+    is fired. Seconds are counted from the last time the elevators moved, which, in an event handler, is the current
+    second, and in update() is the one before. The times assume that the controller does its part without wasting
+    a second: it opens the doors in the arrive_at_floor handler of a floor it's stopping at, and sends the elevator
+    on its way in the second the doors finish closing. Planned stops are floors the elevator will stop at, in order,
+    before getting to the floor in question. An elevator that's moving away from the next place it has to go has to
+    stop at the next floor before it can turn around, since elevators can only change direction when they're idle."""
+
+    # Statuses from which an elevator will be idle, at the floor it's on, in so many seconds.
+    SECONDS_UNTIL_IDLE = {
+        Elevator.IDLE: 0,
+        Elevator.STOPPED: 0,
+        Elevator.OPENING_DOORS_TO_BOARD: 3,
+        Elevator.OPENING_DOORS_TO_DISGORGE: 3,
+        Elevator.BOARDING_RIDERS: 2,
+        Elevator.DISGORGING_RIDERS: 2,
+        Elevator.CLOSING_DOORS: 1,
+    }
+
+    def __init__(self, floor_count):
+        self._top_floor_num = floor_count - 1
+
+    def eta(self, elevator, floor_num, stops=()):
+        """Seconds until the elevator gets to floor_num, after stopping at the given floors on the way."""
+        return self._eta(elevator, self._starting_point(elevator), floor_num, stops)
+
+    def etas(self, elevators, floor_num, stops=None):
+        """The eta() of every elevator to floor_num, as a list. If given, stops is a list of each elevator's planned
+        stops (in the same order as the elevators)."""
+        if stops is None:
+            return [self._eta(e, self._starting_point(e), floor_num, ()) for e in elevators]
+        return [self._eta(e, self._starting_point(e), floor_num, s) for (e, s) in zip(elevators, stops)]
+
+    def eta_table(self, elevators, stops=None):
+        """The eta() of every elevator to every floor: a list for each elevator, indexed by floor number."""
+        table = []
+        for n, e in enumerate(elevators):
+            start = self._starting_point(e)
+            elevator_stops = () if stops is None else stops[n]
+            table.append([self._eta(e, start, floor_num, elevator_stops)
+                          for floor_num in range(self._top_floor_num + 1)])
+        return table
+
+    def _eta(self, elevator, start, floor_num, stops):
+        seconds, at, going = start
+        for stop in stops:
+            seconds, at, going = self._go(elevator, seconds, at, going, stop)
+            seconds += Elevator.DOOR_CYCLE_SECONDS
+            going = None
+        return self._go(elevator, seconds, at, going, floor_num)[0]
+
+    def _go(self, elevator, seconds, at, going, floor_num):
+        """Get from where the elevator is (at a floor, or, if it's going somewhere, wherever it is right now) to
+        floor_num. Returns the same sort of (seconds, where, which way it's going) triple that _starting_point()
+        does."""
+        if going == 'up':
+            if floor_num > at:
+                return seconds + elevator.seconds_until_arrival(floor_num), floor_num, going
+            # Stop at the next floor up (or, at the top, just wait for the elevator to go idle) and turn around.
+            if at >= self._top_floor_num:
+                seconds, at = seconds + 1, self._top_floor_num
+            else:
+                next_floor_num = math.floor(at) + 1
+                seconds += elevator.seconds_until_arrival(next_floor_num) + Elevator.DOOR_CYCLE_SECONDS
+                at = next_floor_num
+        elif going == 'down':
+            if floor_num < at:
+                return seconds + elevator.seconds_until_arrival(floor_num), floor_num, going
+            if at <= 0:
+                seconds, at = seconds + 1, 0
+            else:
+                next_floor_num = math.ceil(at) - 1
+                seconds += elevator.seconds_until_arrival(next_floor_num) + Elevator.DOOR_CYCLE_SECONDS
+                at = next_floor_num
+        going = None if floor_num == at else ('up' if floor_num > at else 'down')
+        if at != math.floor(at):
+            # Standing still between floors (having stopped there with open_doors_to_disembark): the rest of that
+            # floor takes however many steps at setting-off speed it needs, and the run carries on from there.
+            next_floor_num = math.ceil(at) if going == 'up' else math.floor(at)
+            step = Elevator.UNITS_PER_FLOOR // elevator.speed.floor_seconds(0)
+            partial = abs(next_floor_num * Elevator.UNITS_PER_FLOOR - elevator.position)
+            seconds += -(-partial // step)
+            return seconds + elevator.speed.run_seconds(abs(floor_num - next_floor_num), start=1), floor_num, going
+        return seconds + elevator.speed.run_seconds(abs(floor_num - at)), floor_num, going
+
+    def _starting_point(self, elevator):
+        """(seconds from now, floor, direction): when the elevator will be free to go anywhere, and from which floor,
+        or if it's moving, where it is now and which way it's going."""
+        status = elevator.status
+        if status == Elevator.GOING_UP:
+            return 0, elevator.floor_num, 'up'
+        elif status == Elevator.GOING_DOWN:
+            return 0, elevator.floor_num, 'down'
+        return self.SECONDS_UNTIL_IDLE[status], elevator.floor_num, None
@@ -1,34 +1,61 @@
-import collections
+class EventSource:
 
+    __slots__ = ('_handlers', '_pending_events')
 
-class EventSource:
+    # Subclasses list the names of the events they can fire here.
+    EVENT_NAMES = ()
+
+    # Set by wrap_handlers(), on sources that have a __dict__ (elevators and floors, but not riders).
+    _handler_wrappers = ()
 
-    def __init__(self, event_names):
-        self._event_names = event_names
-        self._handlers = collections.defaultdict(list)
-        self._pending_events = []
+    def __init__(self):
+        # Handlers are kept as a tuple of (event name, handler) pairs, and pending events as a list, but neither one is
+        # created until it's needed. Riders are numerous, and most of them only ever get one handler and one event.
+        self._handlers = ()
+        self._pending_events = None
 
     def add_pending_event(self, name, *args):
+        """Queue an event to be fired the next time notify_pending() gets called. Events that nobody has a handler for
+        are dropped right here, so a handler only hears about events that happen after it's registered."""
+        if not self.has_handlers(name):
+            return
+        if self._pending_events is None:
+            self._pending_events = []
         self._pending_events.append((name, *args))
 
     def on(self, event_name, handler):
-        if event_name not in self._event_names:
+        if event_name not in self.EVENT_NAMES:
             raise ValueError(f'unrecognized event name "{event_name}"')
-        self._handlers[event_name].append(handler)
+        for wrapper in self._handler_wrappers:
+            handler = wrapper(event_name, handler)
+        self._handlers += ((event_name, handler),)
+
+    def has_handlers(self, event_name):
+        return any(name == event_name for (name, _) in self._handlers)
+
+    def wrap_handlers(self, wrapper):
+        """Replace every handler with wrapper(event_name, handler), which should return a function to call in its
+        place: the ones registered so far, and any that get registered afterward. This is for tools that measure
+        controllers, like benchmark.py."""
+        self._handlers = tuple((name, wrapper(name, f)) for (name, f) in self._handlers)
+        self._handler_wrappers += (wrapper,)
 
     def notify(self, event_name, *args):
-        messages = []
-        for f in self._handlers[event_name]:
-            m = f(self, *args)
-            if m is not None:
-                messages.append(m)
-        return messages
+        return self._dispatch(event_name, args, [])
 
     def notify_pending(self):
         messages = []
-        for e in self._pending_events:
-            m = self.notify(*e)
-            if m is not None:
-                messages.extend(m)
-        self._pending_events = []
+        if self._pending_events is not None:
+            for name, *args in self._pending_events:
+                self._dispatch(name, args, messages)
+            self._pending_events = None
+        return messages
+
+    def _dispatch(self, event_name, args, messages):
+        """Call the handlers for one event, adding any messages they return to the given list (which gets returned)."""
+        for name, f in self._handlers:
+            if name == event_name:
+                m = f(self, *args)
+                if m is not None:
+                    messages.append(m)
         return messages
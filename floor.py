@@ -1,4 +1,4 @@
-import collections
+import heapq
 
 from errors import NoSuchButton
 from events import EventSource
@@ -6,34 +6,46 @@ from events import EventSource
 
 class Floor(EventSource):
 
+    EVENT_NAMES = ('rider_request',)
+
     def __init__(self, number, has_up_botton=True, has_down_button=True):
-        super().__init__(('rider_request',))
+        super().__init__()
         self.number = number
         self._lacking_button = None
         if not has_up_botton:
             self._lacking_button = 'up'
         elif not has_down_button:
             self._lacking_button = 'down'
-        self._riders_waiting = []
+        # Riders are queued separately by direction, so boarding only has to touch the riders who get on.
+        self._riders_going_down = []
+        self._riders_going_up = []
 
     def add_waiting_rider(self, rider):
-        self._riders_waiting.append(rider)
         if rider.start_floor_num < rider.destination_floor_num:
+            self._riders_going_up.append(rider)
             self.press_up_button()
         else:
+            self._riders_going_down.append(rider)
             self.press_down_button()
 
+    def fork(self):
+        """A copy of this floor for looking ahead (see Building.fork), with no event handlers."""
+        twin = object.__new__(type(self))
+        twin.__dict__.update(self.__dict__)
+        EventSource.__init__(twin)
+        twin.__dict__.pop('_handler_wrappers', None)
+        twin._riders_going_down = list(self._riders_going_down)
+        twin._riders_going_up = list(self._riders_going_up)
+        return twin
+
     def notify_all(self):
         return self.notify_pending()
 
     def pick_up_riders(self, going_up):
-        leaving = [r for r in self._riders_waiting if
-                   (going_up and r.start_floor_num < r.destination_floor_num) or
-                   (not going_up and r.start_floor_num > r.destination_floor_num)]
-        staying = [r for r in self._riders_waiting if
-                   (going_up and r.start_floor_num > r.destination_floor_num) or
-                   (not going_up and r.start_floor_num < r.destination_floor_num)]
-        self._riders_waiting = staying
+        if going_up:
+            leaving, self._riders_going_up = self._riders_going_up, []
+        else:
+            leaving, self._riders_going_down = self._riders_going_down, []
         return leaving
 
     def press_up_button(self):
@@ -46,7 +58,20 @@ class Floor(EventSource):
 
     @property
     def riders_waiting(self):
-        return self._riders_waiting
+        """Everybody waiting on this floor, in the order they showed up."""
+        return list(heapq.merge(self._riders_going_up, self._riders_going_down, key=lambda r: r.number))
+
+    @property
+    def riders_waiting_down(self):
+        return self._riders_going_down
+
+    @property
+    def riders_waiting_up(self):
+        return self._riders_going_up
+
+    @property
+    def waiting_count(self):
+        return len(self._riders_going_up) + len(self._riders_going_down)
 
     def _check_button(self, direction):
         if self._lacking_button == direction:
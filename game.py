@@ -0,0 +1,195 @@
+import importlib
+import inspect
+import re
+import sys
+
+from scenarios import Scenario
+from state import state_view_for, update_controller
+
+SCENARIO_CLASS_REGEX = re.compile(r'^class (\w+)\(\w+\):$')
+
+
+def get_elevator_positions(building):
+    return [e.floor_num for e in building.elevators]
+
+
+def import_scenarios():
+    """The scenarios that can be played just by giving them a building (which leaves out base classes that need
+    more to go on, like TrafficScenario), by name."""
+    mod = sys.modules['scenarios']
+    return {nm:clz for (nm, clz) in
+            inspect.getmembers(mod, inspect.isclass) if issubclass(clz, Scenario) and _takes_just_a_building(clz)}
+
+
+def default_scenarios():
+    """The scenarios that get played when none are asked for by name: import_scenarios(), but without the ones
+    that take a long time (like the TrafficScenarios)."""
+    return {nm: clz for (nm, clz) in import_scenarios().items() if clz.PLAYED_BY_DEFAULT}
+
+
+def load_controller_class(prefix):
+    """Find the controller class in "<prefix>_controller.py". Raises ModuleNotFoundError if there's no such file,
+    and StopIteration if it doesn't contain a class whose name ends in "Controller"."""
+    mod = importlib.import_module(f'{prefix}_controller')
+    return next(clz for (nm, clz) in inspect.getmembers(mod, inspect.isclass) if nm.endswith('Controller'))
+
+
+def scenario_pairs_in_source_order(scenarios):
+    result = []
+    with open('scenarios.py', 'rt') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            m = SCENARIO_CLASS_REGEX.match(line.rstrip())
+            if m and m[1] in scenarios:
+                result.append((m[1], scenarios[m[1]]))
+    return result
+
+
+def game_loop(scenario, building, controller, force_duration=None, after_tick=None, profiler=None):
+    """Run the simulation one game second at a time until the scenario concludes. Returns a pair: the scenario
+    conclusion (one of the Scenario constants) and the number of seconds that elapsed. If an after_tick function is
+    given, it's called with the elapsed time at the end of every second (that's where drawing and sleeping go).
+    If a profiler (see instrumentation.py) is given, every phase of every second gets timed.
+
+    If the controller has a begin_second(elapsed) method (like budget.TimeBudget does), it gets called at the very
+    start of every second. If it asks for a state.StateView, its update() gets one."""
+    controller_begin_second = getattr(controller, 'begin_second', None)
+    state = state_view_for(controller, building.elevators, building.floors)
+    stuck = StuckDetector(building)
+    elapsed = 0
+    while True:
+        if controller_begin_second is not None:
+            controller_begin_second(elapsed)
+        conclusion = _play_one_second(scenario, building, controller, force_duration, elapsed, state, profiler)
+        if conclusion is not None:
+            return conclusion, elapsed
+        if after_tick is not None:
+            after_tick(elapsed)
+        if stuck.check(elapsed):
+            return Scenario.STUCK, elapsed
+        elapsed += 1
+
+
+def event_loop(scenario, building, controller, force_duration=None, profiler=None):
+    """Like game_loop(), but instead of plodding through every second, jump straight to the next second in which
+    something can happen: a rider shows up, an elevator reaches a floor or its doors move, an event handler needs
+    calling, or the scenario runs out of time. The seconds in between, when elevators are just cruising along or
+    the building is sitting idle, are skipped over without calling anybody's update(). Scores come out the same as
+    with game_loop(), but long and sparse scenarios run in time proportional to the number of things happening.
+
+    The controller's update() is called every second unless the controller has a next_update(elapsed) method,
+    which works like Scenario.next_update(): it returns the earliest second in which update() might do anything
+    (or None for never). Its begin_second(), if it has one, is only called for the seconds that aren't skipped."""
+    controller_begin_second = getattr(controller, 'begin_second', None)
+    controller_next_update = getattr(controller, 'next_update', None)
+    state = state_view_for(controller, building.elevators, building.floors)
+    stuck = StuckDetector(building)
+    elapsed = 0
+    while True:
+        if controller_begin_second is not None:
+            controller_begin_second(elapsed)
+        conclusion = _play_one_second(scenario, building, controller, force_duration, elapsed, state, profiler)
+        if conclusion is not None:
+            return conclusion, elapsed
+        if stuck.check(elapsed):
+            return Scenario.STUCK, elapsed
+
+        elapsed += 1
+        wake_at = [scenario.next_update(elapsed), scenario.max_duration + 1, stuck.last_changed + 11]
+        if force_duration is not None:
+            wake_at.extend((force_duration, force_duration + 1))
+        if scenario.should_continue(elapsed, building) != Scenario.CONTINUE:
+            wake_at.append(elapsed)
+        wake_at.append(elapsed if controller_next_update is None else controller_next_update(elapsed))
+        for e in building.elevators:
+            ticks = e.coasting_ticks(building)
+            if ticks is not None:
+                wake_at.append(elapsed + ticks)
+
+        next_elapsed = min(t for t in wake_at if t is not None and t >= elapsed)
+        if next_elapsed > elapsed:
+            for e in building.elevators:
+                e.coast(next_elapsed - elapsed)
+            # Whether the building looks stuck is only decided in seconds that get played.
+            stuck.check(next_elapsed - 1)
+            elapsed = next_elapsed
+
+
+def simulate_headless(scenario, building, controller, force_duration=None, event_driven=False, profiler=None,
+                      after_tick=None):
+    """Run a scenario as fast as possible, without drawing, sleeping or printing anything, and return the
+    building's score dict. With event_driven=True, use event_loop() rather than game_loop(). An after_tick function
+    (see game_loop()) needs every second, so it can't be used with event_driven."""
+    if event_driven:
+        if after_tick is not None:
+            raise ValueError("after_tick can't be used with event_driven, which skips seconds")
+        _, elapsed = event_loop(scenario, building, controller, force_duration=force_duration, profiler=profiler)
+    else:
+        _, elapsed = game_loop(scenario, building, controller, force_duration=force_duration, after_tick=after_tick,
+                               profiler=profiler)
+    return building.score(elapsed)
+
+
+def scenario_conclusion(scenario, building, force_duration, elapsed):
+    """The start of every game second: the scenario adds its riders, and decides whether the game's over. Returns
+    the conclusion if it is, otherwise None."""
+    scenario.update(elapsed, building)
+    should_continue = scenario.should_continue(elapsed, building)
+    if should_continue != Scenario.CONTINUE:
+        if should_continue != Scenario.TIMED_OUT or force_duration is None or elapsed >= force_duration:
+            return should_continue
+    elif force_duration is not None and force_duration < elapsed:
+        return Scenario.TIMED_OUT
+    return None
+
+
+class StuckDetector:
+    """Notices when somebody's waiting or riding, but the elevators haven't moved in more than ten seconds."""
+
+    def __init__(self, building):
+        self.last_changed = 0
+        self._building = building
+        self._positions = get_elevator_positions(building)
+
+    def check(self, elapsed):
+        """Call this at the end of every game second played. Returns True if the game's stuck."""
+        positions = get_elevator_positions(self._building)
+        if positions != self._positions or not self._building.has_active_riders():
+            self._positions = positions
+            self.last_changed = elapsed
+            return False
+        return self.last_changed < elapsed - 10
+
+
+def _takes_just_a_building(scenario_class):
+    try:
+        inspect.signature(scenario_class).bind(None)
+    except TypeError:
+        return False
+    return True
+
+
+def _play_one_second(scenario, building, controller, force_duration, elapsed, state, profiler=None):
+    """Everything that happens in one game second. Returns the scenario's conclusion if it's time to stop,
+    otherwise None. With a profiler, every phase gets timed."""
+    if profiler is not None:
+        profiler.begin_tick(elapsed)
+    conclusion = scenario_conclusion(scenario, building, force_duration, elapsed)
+    if profiler is not None:
+        profiler.lap('scenario')
+    if conclusion is not None:
+        return conclusion
+    msg = update_controller(controller, elapsed, building.elevators, building.floors, state)
+    if msg is not None:
+        building.add_message('Ctr', elapsed, msg)
+    if profiler is not None:
+        profiler.lap('controller')
+    building.update_all(elapsed)
+    if profiler is not None:
+        profiler.lap('update_all')
+    building.notify_all(elapsed)
+    if profiler is not None:
+        profiler.lap('notify_all')
+    return None
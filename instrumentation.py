@@ -0,0 +1,96 @@
+import time
+
+
+class Profiler:
+    """Keeps track of where the time goes in a simulation: how long each phase of every game second takes, and how
+    long the controller's event handlers take for each kind of event. Make one once the building's been set up, hand
+    it to game_loop() or event_loop() (or simulate()), and ask for the summary() at the end.
+
+    With a trace_path, it also writes one CSV line per game second played, with the time (in microseconds) spent
+    in each phase and in handlers, and how many handler calls there were (an event with three handlers is three
+    calls). Handlers are timed as part of the notify_all phase (or update_all, for riders' handlers, which aren't
+    timed separately), so they're not extra time on top. Handlers that the controller registers after the profiler
+    is made get timed too."""
+
+    # after_tick is the game loop's after_tick function (recording, metrics and so on), apart from drawing.
+    PHASES = ('scenario', 'controller', 'update_all', 'notify_all', 'after_tick', 'draw')
+
+    def __init__(self, building, trace_path=None):
+        self.ticks = 0
+        self.phase_seconds = dict.fromkeys(self.PHASES, 0)
+        # Per event name: [number of handler calls, total seconds, longest single call in seconds]
+        self.handler_stats = {}
+        self._handler_calls = 0
+        self._handler_seconds = 0
+        self._mark = None
+        self._tick = None
+        self._trace = None
+        if trace_path is not None:
+            self._trace = open(trace_path, 'wt', buffering=1024 * 1024)
+            self._trace.write(','.join(('elapsed',) + self.PHASES + ('handlers', 'handler_calls')) + '\n')
+        for source in building.elevators + building.floors:
+            source.wrap_handlers(self._timed_handler)
+
+    def begin_tick(self, elapsed):
+        self._finish_tick()
+        self.ticks += 1
+        self._tick = [elapsed] + [0] * len(self.PHASES)
+        self._handler_calls = 0
+        self._handler_seconds = 0
+        self._mark = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the last lap (or the start of the game second) to the given phase."""
+        now = time.perf_counter()
+        seconds = now - self._mark
+        self._mark = now
+        self.phase_seconds[phase] += seconds
+        self._tick[self.PHASES.index(phase) + 1] += seconds
+
+    def close(self):
+        self._finish_tick()
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+    def summary(self):
+        ticks = max(self.ticks, 1)
+        total = sum(self.phase_seconds.values()) or 1
+        lines = [f'{"phase":>12}  {"seconds":>9}  {"us/tick":>9}  {"share":>6}']
+        for phase in self.PHASES:
+            seconds = self.phase_seconds[phase]
+            lines.append(f'{phase:>12}  {seconds:9.4f}  {seconds / ticks * 1e6:9.1f}  {seconds / total:6.1%}')
+        lines.append(f'{"(total)":>12}  {total:9.4f}  {total / ticks * 1e6:9.1f}  over {self.ticks} game seconds')
+
+        if self.handler_stats:
+            lines.append('')
+            lines.append(f'{"event":>16}  {"calls":>8}  {"seconds":>9}  {"mean us":>9}  {"max us":>9}')
+            for name, (calls, seconds, longest) in sorted(self.handler_stats.items()):
+                mean = seconds / calls if calls else 0
+                lines.append(f'{name:>16}  {calls:8}  {seconds:9.4f}  {mean * 1e6:9.1f}  {longest * 1e6:9.1f}')
+        return '\n'.join(lines)
+
+    def _finish_tick(self):
+        if self._tick is None:
+            return
+        if self._trace is not None:
+            micros = [round(s * 1e6) for s in self._tick[1:]]
+            self._trace.write(f'{self._tick[0]},{",".join(map(str, micros))},'
+                              f'{round(self._handler_seconds * 1e6)},{self._handler_calls}\n')
+        self._tick = None
+
+    def _timed_handler(self, event_name, handler):
+        stats = self.handler_stats.setdefault(event_name, [0, 0, 0])
+
+        def timed(*args):
+            started = time.perf_counter()
+            try:
+                return handler(*args)
+            finally:
+                seconds = time.perf_counter() - started
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+                self._handler_calls += 1
+                self._handler_seconds += seconds
+        return timed
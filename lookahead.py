@@ -0,0 +1,46 @@
+"""Tools for controllers that plan by trying things out: fork the building (Building.fork), tell the fork's elevators
+to do something, run it forward a few seconds, and compare the score with what it would have been."""
+
+from elevator import Elevator
+from state import state_view_for, update_controller
+
+SCORE_DELTA_KEYS = ('finished_rides', 'unfinished_rides', 'average_wait', 'average_trip', 'trip_efficiency')
+
+
+def advance(building, elapsed, ticks, controller=None):
+    """Run a building (usually a fork) forward for `ticks` seconds, starting with second `elapsed`, the same way the
+    game loop would, except that no new riders show up. If a controller is given, its update() gets called every
+    second; it should be one made for this building's own elevators and floors, and any handlers it registered on
+    them get called too. Returns the elapsed time afterward, for passing to score()."""
+    state = state_view_for(controller, building.elevators, building.floors)
+    for t in range(elapsed, elapsed + ticks):
+        if controller is not None:
+            update_controller(controller, t, building.elevators, building.floors, state)
+        building.update_all(t)
+        building.notify_all(t)
+    return elapsed + ticks
+
+
+def score_delta(before, after):
+    """How two score dicts differ (after minus before), leaving out the controller's time, which isn't a result."""
+    return {key: after[key] - before[key] for key in SCORE_DELTA_KEYS}
+
+
+def what_if(building, elapsed, ticks, move=None, make_controller=None):
+    """Fork the building as of the end of second `elapsed - 1`, do move(fork) to it (tell its elevators what to do,
+    say), and run it forward for `ticks` seconds, with the controller make_controller(fork) returns, if it's given.
+    Returns the change in score over those seconds.
+
+    The fork is taken partway through a run, so elevators may be between floors, and a controller that tells them
+    to do things as soon as it's made (like DumbElevatorController, which has its elevator board riders) may not be
+    able to start out that way. make_controller gets the fork so it can make a controller that knows where things
+    stand. A ValueError is raised if an elevator has been told to board riders between floors."""
+    fork = building.fork()
+    if move is not None:
+        move(fork)
+    controller = None if make_controller is None else make_controller(fork)
+    for n, e in enumerate(fork.elevators):
+        if e.status == Elevator.OPENING_DOORS_TO_BOARD and e.position % Elevator.UNITS_PER_FLOOR != 0:
+            raise ValueError(f'elevator {n} was told to board riders at floor {e.floor_num:.2f}, between floors')
+    end = advance(fork, elapsed, ticks, controller=controller)
+    return score_delta(building.score(elapsed), fork.score(end))
@@ -0,0 +1,245 @@
+import math
+
+from elevator import Elevator
+
+# Elevator statuses by number, for reports.
+STATUS_NAMES = ('idle', 'going_up', 'going_down', 'stopped', 'opening_doors_to_board', 'boarding_riders',
+                'closing_doors', 'opening_doors_to_disgorge', 'disgorging_riders')
+# Statuses in which an elevator is doing something, as far as utilization goes.
+BUSY_STATUSES = tuple(n for n in range(len(STATUS_NAMES)) if n not in (Elevator.IDLE, Elevator.STOPPED))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class QuantileSketch:
+    """Keeps track of how a stream of non-negative numbers is distributed, closely enough to say what any quantile
+    of it is (within relative_accuracy of a number that's really in the stream) without keeping every number.
+    Numbers are counted in buckets whose bounds grow geometrically, so a few hundred buckets cover everything from
+    a second to a day. Sketches with the same accuracy can be merged, which gives the same sketch as if all the
+    numbers had been added to one of them."""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self.max = None
+        self.min = None
+        self._buckets = {}
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._zero_count = 0
+
+    def add(self, value):
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value <= 0:
+            self._zero_count += 1
+        else:
+            bucket = math.ceil(math.log(value) / self._log_gamma)
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def merge(self, other):
+        """Add everything counted by the other sketch to this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f"can't merge sketches with different accuracies ({self.relative_accuracy} and "
+                             f"{other.relative_accuracy})")
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._zero_count += other._zero_count
+        for bucket, count in other._buckets.items():
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + count
+
+    def quantile(self, q):
+        """The number that a fraction q (between 0 and 1) of the stream is at or below, or None for an empty
+        stream."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if rank < seen:
+            return max(0, self.min)
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if rank < seen:
+                # The middle of the bucket, as far as relative error goes.
+                value = 2 * self._gamma ** bucket / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'relative_accuracy': self.relative_accuracy, 'count': self.count, 'min': self.min, 'max': self.max,
+                'zero_count': self._zero_count, 'buckets': {str(b): c for (b, c) in self._buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.count = data['count']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        sketch._zero_count = data['zero_count']
+        sketch._buckets = {int(b): c for (b, c) in data['buckets'].items()}
+        return sketch
+
+
+class RunMetrics:
+    """What MetricsCollector found out about one run, or, merged (see merge()), about any number of runs in
+    buildings of the same size:
+    - wait and trip: QuantileSketches of how long riders waited for an elevator (riders who were still waiting at
+      the end count with the time they'd waited so far) and how long their rides took.
+    - Time series, in buckets of bucket_seconds: for every floor, the total of its queue length over every second
+      (queue_seconds[floor][bucket]) and the longest it got (queue_peak[floor][bucket]); for every elevator, how
+      many seconds it spent in every status (status_seconds[elevator][bucket][status]); and how many seconds went
+      into every bucket (seconds[bucket]), over all runs."""
+
+    def __init__(self, elevator_count, floor_count, bucket_seconds=60):
+        self.bucket_seconds = bucket_seconds
+        self.queue_peak = [[] for _ in range(floor_count)]
+        self.queue_seconds = [[] for _ in range(floor_count)]
+        self.runs = 1
+        self.seconds = []
+        self.status_seconds = [[] for _ in range(elevator_count)]
+        self.trip = QuantileSketch()
+        self.wait = QuantileSketch()
+
+    def merge(self, other):
+        """Add another run's (or other runs') metrics to these."""
+        if (len(other.status_seconds), len(other.queue_seconds), other.bucket_seconds) != \
+                (len(self.status_seconds), len(self.queue_seconds), self.bucket_seconds):
+            raise ValueError("can't merge metrics of different sized buildings, or with different bucket sizes")
+        self.runs += other.runs
+        self.wait.merge(other.wait)
+        self.trip.merge(other.trip)
+        _add_series(self.seconds, other.seconds)
+        for mine, theirs in zip(self.queue_seconds, other.queue_seconds):
+            _add_series(mine, theirs)
+        for mine, theirs in zip(self.queue_peak, other.queue_peak):
+            _extend(mine, len(theirs), 0)
+            for bucket, peak in enumerate(theirs):
+                mine[bucket] = max(mine[bucket], peak)
+        for mine, theirs in zip(self.status_seconds, other.status_seconds):
+            _extend(mine, len(theirs), None)
+            for bucket, counts in enumerate(theirs):
+                if mine[bucket] is None:
+                    mine[bucket] = [0] * len(STATUS_NAMES)
+                for status, count in enumerate(counts):
+                    mine[bucket][status] += count
+        return self
+
+    def queue_series(self):
+        """The average total number of riders waiting, over all floors, in every bucket."""
+        return [(sum(floor[bucket] for floor in self.queue_seconds if bucket < len(floor)) / seconds
+                 if seconds else 0) for (bucket, seconds) in enumerate(self.seconds)]
+
+    def utilization(self, elevator_num=None):
+        """The fraction of the time that the elevator (or, by default, all of them) spent doing something."""
+        elevators = self.status_seconds if elevator_num is None else [self.status_seconds[elevator_num]]
+        total = busy = 0
+        for buckets in elevators:
+            for counts in buckets:
+                total += sum(counts)
+                busy += sum(counts[status] for status in BUSY_STATUSES)
+        return busy / total if total else 0
+
+    def summary(self):
+        """A few lines of text with the numbers that matter most."""
+        lines = []
+        for name, sketch in (('wait for elevator', self.wait), ('trip time', self.trip)):
+            if sketch.count:
+                quantiles = ', '.join(f'p{round(q * 100)} {sketch.quantile(q):.0f}' for q in QUANTILES)
+                lines.append(f'{name}: {quantiles}, max {sketch.max} seconds ({sketch.count} riders)')
+        series = self.queue_series()
+        if series:
+            peak_bucket = max(range(len(series)), key=lambda b: series[b])
+            peak_floor = max(range(len(self.queue_peak)),
+                             key=lambda f: max(self.queue_peak[f], default=0))
+            lines.append(f'riders waiting: {series[peak_bucket]:.1f} on average in the busiest '
+                         f'{self.bucket_seconds} seconds (from {peak_bucket * self.bucket_seconds}), '
+                         f'at most {max(self.queue_peak[peak_floor], default=0)} on one floor (floor {peak_floor})')
+        lines.append('elevator utilization: ' + ', '.join(f'Elv {n} {self.utilization(n):.0%}'
+                                                         for n in range(len(self.status_seconds))))
+        if self.runs > 1:
+            lines.append(f'(over {self.runs} runs)')
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {'bucket_seconds': self.bucket_seconds, 'runs': self.runs, 'wait': self.wait.to_dict(),
+                'trip': self.trip.to_dict(), 'seconds': self.seconds, 'queue_seconds': self.queue_seconds,
+                'queue_peak': self.queue_peak, 'status_seconds': self.status_seconds, 'status_names': STATUS_NAMES}
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls(len(data['status_seconds']), len(data['queue_seconds']), data['bucket_seconds'])
+        metrics.runs = data['runs']
+        metrics.wait = QuantileSketch.from_dict(data['wait'])
+        metrics.trip = QuantileSketch.from_dict(data['trip'])
+        metrics.seconds = list(data['seconds'])
+        metrics.queue_seconds = [list(series) for series in data['queue_seconds']]
+        metrics.queue_peak = [list(series) for series in data['queue_peak']]
+        metrics.status_seconds = [[None if counts is None else list(counts) for counts in series]
+                                  for series in data['status_seconds']]
+        return metrics
+
+
+class MetricsCollector:
+    """Keeps RunMetrics up to date as a run goes along. Make one once the building's been set up, pass its sample()
+    to the game loop as after_tick (it has to see every second), and call finish() when the game's over."""
+
+    def __init__(self, building, bucket_seconds=60):
+        self._building = building
+        self._last_elapsed = None
+        self.metrics = RunMetrics(len(building.elevators), len(building.floors), bucket_seconds=bucket_seconds)
+        building.add_ride_listener(self._riders_moved)
+
+    def finish(self, elapsed=None):
+        """Count the riders who are still waiting, as of `elapsed` (by default, the second after the last one
+        sampled, which is when the game loops stop), and return the metrics."""
+        if elapsed is None:
+            elapsed = 0 if self._last_elapsed is None else self._last_elapsed + 1
+        for f in self._building.floors:
+            for r in f.riders_waiting_up + f.riders_waiting_down:
+                self.metrics.wait.add(elapsed - r.started_waiting)
+        return self.metrics
+
+    def sample(self, elapsed):
+        """Take note of the queues and what the elevators are doing at the end of second `elapsed`."""
+        self._last_elapsed = elapsed
+        metrics = self.metrics
+        bucket = elapsed // metrics.bucket_seconds
+        if bucket >= len(metrics.seconds):
+            _extend(metrics.seconds, bucket + 1, 0)
+            for series in metrics.queue_seconds + metrics.queue_peak:
+                _extend(series, bucket + 1, 0)
+            for series in metrics.status_seconds:
+                while len(series) <= bucket:
+                    series.append([0] * len(STATUS_NAMES))
+        metrics.seconds[bucket] += 1
+        for f, seconds, peak in zip(self._building.floors, metrics.queue_seconds, metrics.queue_peak):
+            waiting = f.waiting_count
+            seconds[bucket] += waiting
+            if waiting > peak[bucket]:
+                peak[bucket] = waiting
+        for e, series in zip(self._building.elevators, metrics.status_seconds):
+            series[bucket][e.status] += 1
+
+    def _riders_moved(self, riders, elevator, _):
+        if elevator is None:
+            for r in riders:
+                self.metrics.trip.add(r.trip_end - r.trip_start)
+        else:
+            for r in riders:
+                self.metrics.wait.add(r.trip_start - r.started_waiting)
+
+
+def _add_series(mine, theirs):
+    _extend(mine, len(theirs), 0)
+    for bucket, value in enumerate(theirs):
+        mine[bucket] += value
+
+
+def _extend(series, length, filler):
+    if len(series) < length:
+        series.extend([filler] * (length - len(series)))
@@ -0,0 +1,412 @@
+#!/usr/local/bin/python
+import argparse
+import collections
+import mmap
+import os
+import struct
+import time
+
+from building import Building
+from elevator import Elevator
+from floor import Floor
+from renderer import TerminalRenderer
+
+RECORDING_MAGIC = b'EYRUN002'
+HEADER = struct.Struct('<8sHHIH')   # magic, elevator count, floor count, keyframe interval, length of name
+RECORD_HEADER = struct.Struct('<BI')   # kind of record (see below), length of what follows
+FOOTER = struct.Struct('<Q8s')   # where the index record starts, magic
+
+KEYFRAME = 1
+TICK = 2
+INDEX = 3
+
+COUNT = struct.Struct('<H')   # of elevators or floors, which the header holds to this size too
+BIG_COUNT = struct.Struct('<I')
+ELAPSED = struct.Struct('<I')
+OFFSET = struct.Struct('<Q')
+ELEVATOR_STATE = struct.Struct('<qBI')   # position, status, rider count
+ELEVATOR_CHANGE = struct.Struct('<HqBI')   # elevator number, and then the same
+FLOOR_STATE = struct.Struct('<II')   # riders waiting to go up, riders waiting to go down
+FLOOR_CHANGE = struct.Struct('<HII')   # floor number, and then the same
+RIDER_EVENT = struct.Struct('<BIHH')   # kind (an index into RIDER_EVENTS, plus one), rider number, and two numbers:
+RIDER_EVENTS = (
+    'new',   # start floor, destination floor
+    'boarded',   # elevator number, floor number
+    'got_off',   # floor number, 0
+)
+MESSAGE_HEAD = struct.Struct('<I3sH')   # elapsed, origin, length of the UTF-8 text that follows
+
+
+class Recorder:
+    """Records a whole run, second by second, so that Recording can play it back from any second, without the
+    simulation. Make one once the building's been set up (along with its controller and scenario, so their
+    messages are caught), pass its record() to the game loop as after_tick, and close() it when the game's over.
+
+    Files are append-only: a header, then a record for every second. Every keyframe_interval seconds, the record is
+    a keyframe, which has everything that's needed to draw the building; the records in between just have what
+    changed. Along with elevators and waiting riders, every second's record has the riders who showed up, got on or
+    got off, and the messages. Closing the recorder adds an index of the keyframes, which makes seeking a lookup;
+    a recording of a run that crashed before that can still be played, but has to be read through to find them."""
+
+    def __init__(self, path, building, keyframe_interval=60):
+        self._building = building
+        self._file = open(path, 'wb', buffering=1024 * 1024)
+        self._keyframe_interval = keyframe_interval
+        self._keyframe_offsets = []
+        self._last_elevators = None
+        self._last_floors = None
+        self._messages = []
+        # Keyframes carry as many of the latest messages as the building has room to show.
+        self._recent_messages = collections.deque(maxlen=2 * len(building.floors))
+        self._rider_events = []
+        name = building.name.encode()
+        self._file.write(HEADER.pack(RECORDING_MAGIC, len(building.elevators), len(building.floors),
+                                     keyframe_interval, len(name)))
+        self._file.write(name)
+        self._offset = HEADER.size + len(name)
+        building.add_message_listener(self._messages.append)
+        building.add_ride_listener(self._riders_moved)
+        building.add_rider_listener(self._rider_showed_up)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        if self._file is None:
+            return
+        index = BIG_COUNT.pack(len(self._keyframe_offsets)) + b''.join(OFFSET.pack(offset) for offset in
+                                                                        self._keyframe_offsets)
+        index_offset = self._offset
+        self._write(INDEX, index)
+        self._file.write(FOOTER.pack(index_offset, RECORDING_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def record(self, elapsed):
+        """Record the state of the building at the end of second `elapsed`, and everything that happened during it."""
+        elevators = [(e.position, e.status, e.rider_count) for e in self._building.elevators]
+        floors = [(len(f.riders_waiting_up), len(f.riders_waiting_down)) for f in self._building.floors]
+        messages = [(m_elapsed, origin, msg() if callable(msg) else msg) for (m_elapsed, origin, msg) in
+                    self._messages]
+        self._messages.clear()
+        self._recent_messages.extend(messages)
+
+        parts = [ELAPSED.pack(elapsed)]
+        if elapsed // self._keyframe_interval >= len(self._keyframe_offsets):
+            # Normally there's a keyframe for every slot in the index, but if seconds got skipped, some slots have
+            # to share the next one.
+            self._keyframe_offsets.extend([self._offset] * (elapsed // self._keyframe_interval -
+                                                            len(self._keyframe_offsets) + 1))
+            parts.extend(ELEVATOR_STATE.pack(*state) for state in elevators)
+            parts.extend(FLOOR_STATE.pack(*state) for state in floors)
+            kind = KEYFRAME
+        else:
+            changed = [(n, state) for (n, (state, last)) in enumerate(zip(elevators, self._last_elevators))
+                       if state != last]
+            parts.append(COUNT.pack(len(changed)))
+            parts.extend(ELEVATOR_CHANGE.pack(n, *state) for (n, state) in changed)
+            changed = [(n, state) for (n, (state, last)) in enumerate(zip(floors, self._last_floors)) if state != last]
+            parts.append(COUNT.pack(len(changed)))
+            parts.extend(FLOOR_CHANGE.pack(n, *state) for (n, state) in changed)
+            kind = TICK
+        parts.append(BIG_COUNT.pack(len(self._rider_events)))
+        parts.extend(RIDER_EVENT.pack(*event) for event in self._rider_events)
+        if kind == KEYFRAME:
+            # The latest messages, of which the last few are new.
+            parts.append(BIG_COUNT.pack(len(messages)))
+            messages = self._recent_messages
+        parts.append(BIG_COUNT.pack(len(messages)))
+        parts.extend(_pack_message(message) for message in messages)
+        self._write(kind, b''.join(parts))
+
+        self._last_elevators = elevators
+        self._last_floors = floors
+        self._rider_events.clear()
+
+    def _rider_showed_up(self, rider, _):
+        self._rider_events.append((1, rider.number, rider.start_floor_num, rider.destination_floor_num))
+
+    def _riders_moved(self, riders, elevator, _):
+        if elevator is None:
+            self._rider_events.extend((3, r.number, r.destination_floor_num, 0) for r in riders)
+        else:
+            self._rider_events.extend((2, r.number, elevator.number, elevator.floor_num) for r in riders)
+
+    def _write(self, kind, payload):
+        self._file.write(RECORD_HEADER.pack(kind, len(payload)))
+        self._file.write(payload)
+        self._offset += RECORD_HEADER.size + len(payload)
+
+
+class RunState:
+    """The state of a recorded run at the end of one second: where every elevator was, what it was doing and how
+    many riders it had (elevators: lists of [position, status, rider count]), how many riders were waiting to go up
+    and down on every floor (floors: lists of [up, down]), the rider events of that second (rider_events:
+    (event, rider number, ...) tuples; see RIDER_EVENTS) and the latest messages, as (elapsed, origin, text)."""
+
+    def __init__(self, elevator_count, floor_count):
+        self.elapsed = None
+        self.elevators = [[0, Elevator.IDLE, 0] for _ in range(elevator_count)]
+        self.floors = [[0, 0] for _ in range(floor_count)]
+        self.messages = collections.deque(maxlen=2 * floor_count)
+        self.new_message_count = 0
+        self.rider_events = []
+
+    def apply(self, kind, payload):
+        """Bring the state up to date with a keyframe or tick record."""
+        self.elapsed, = ELAPSED.unpack_from(payload, 0)
+        offset = ELAPSED.size
+        if kind == KEYFRAME:
+            for state in self.elevators:
+                state[:] = ELEVATOR_STATE.unpack_from(payload, offset)
+                offset += ELEVATOR_STATE.size
+            for state in self.floors:
+                state[:] = FLOOR_STATE.unpack_from(payload, offset)
+                offset += FLOOR_STATE.size
+        else:
+            count, = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+            for _ in range(count):
+                n, *state = ELEVATOR_CHANGE.unpack_from(payload, offset)
+                self.elevators[n][:] = state
+                offset += ELEVATOR_CHANGE.size
+            count, = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+            for _ in range(count):
+                n, *state = FLOOR_CHANGE.unpack_from(payload, offset)
+                self.floors[n][:] = state
+                offset += FLOOR_CHANGE.size
+
+        count, = BIG_COUNT.unpack_from(payload, offset)
+        offset += BIG_COUNT.size
+        self.rider_events = []
+        for _ in range(count):
+            kind_num, *numbers = RIDER_EVENT.unpack_from(payload, offset)
+            self.rider_events.append((RIDER_EVENTS[kind_num - 1], *numbers))
+            offset += RIDER_EVENT.size
+
+        if kind == KEYFRAME:
+            self.messages.clear()
+            self.new_message_count, = BIG_COUNT.unpack_from(payload, offset)
+            offset += BIG_COUNT.size
+        count, = BIG_COUNT.unpack_from(payload, offset)
+        offset += BIG_COUNT.size
+        if kind == TICK:
+            self.new_message_count = count
+        for _ in range(count):
+            m_elapsed, origin, length = MESSAGE_HEAD.unpack_from(payload, offset)
+            offset += MESSAGE_HEAD.size
+            text = bytes(payload[offset:offset + length]).decode(errors='replace')
+            offset += length
+            self.messages.append((m_elapsed, origin.rstrip(b'\0').decode(errors='replace'), text))
+
+    def copy(self):
+        twin = RunState(len(self.elevators), len(self.floors))
+        twin.elapsed = self.elapsed
+        twin.elevators = [list(state) for state in self.elevators]
+        twin.floors = [list(state) for state in self.floors]
+        twin.messages.extend(self.messages)
+        twin.new_message_count = self.new_message_count
+        twin.rider_events = list(self.rider_events)
+        return twin
+
+
+class Recording:
+    """A recording made by Recorder, read straight out of a memory map."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        if os.fstat(self._file.fileno()).st_size < HEADER.size:
+            raise ValueError(f'{path} is not a recording')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.elevator_count, self.floor_count, self.keyframe_interval, name_length = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != RECORDING_MAGIC:
+            raise ValueError(f'{path} is not a recording')
+        self.name = self._mm[HEADER.size:HEADER.size + name_length].decode()
+        self._first_record = HEADER.size + name_length
+        self._end = len(self._mm)
+        self._keyframe_offsets = None
+        if self._end >= self._first_record + FOOTER.size:
+            index_offset, magic = FOOTER.unpack_from(self._mm, self._end - FOOTER.size)
+            if magic == RECORDING_MAGIC:
+                self._end = index_offset
+                _, payload = self._record_at(index_offset)[:2]
+                count, = BIG_COUNT.unpack_from(payload, 0)
+                self._keyframe_offsets = [OFFSET.unpack_from(payload, BIG_COUNT.size + n * OFFSET.size)[0]
+                                          for n in range(count)]
+        if self._keyframe_offsets is None:
+            # The recorder didn't get to write its index, so find the keyframes the long way.
+            self._keyframe_offsets = []
+            for offset, kind, payload in self._records(self._first_record):
+                if kind == KEYFRAME:
+                    elapsed, = ELAPSED.unpack_from(payload, 0)
+                    while len(self._keyframe_offsets) <= elapsed // self.keyframe_interval:
+                        self._keyframe_offsets.append(offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    @property
+    def last_elapsed(self):
+        """The last second recorded (None if there aren't any)."""
+        last = None
+        if self._keyframe_offsets:
+            for _, _, payload in self._records(self._keyframe_offsets[-1]):
+                last, = ELAPSED.unpack_from(payload, 0)
+        return last
+
+    def play(self, start=0, end=None):
+        """Generate the state of the run at the end of every recorded second from start to end (or the end of
+        the recording), as one RunState that gets updated each time."""
+        if not self._keyframe_offsets:
+            return
+        state, offset = self._keyframe_state(start)
+        if end is not None and state.elapsed > end:
+            return
+        if state.elapsed >= start:
+            yield state
+        for _, kind, payload in self._records(offset):
+            if kind == KEYFRAME or kind == TICK:
+                if end is not None and ELAPSED.unpack_from(payload, 0)[0] > end:
+                    return
+                state.apply(kind, payload)
+                if state.elapsed >= start:
+                    yield state
+
+    def state_at(self, elapsed):
+        """The state of the run at the end of second `elapsed` (or the first recorded second after it), as a RunState
+        of its own; None if that's past the end of the recording."""
+        return next((state.copy() for state in self.play(elapsed)), None)
+
+    def _keyframe_state(self, elapsed):
+        """The state at the latest keyframe at or before elapsed (or the first one, if there isn't one), and the
+        offset of the record after it."""
+        slot = min(max(0, elapsed) // self.keyframe_interval, len(self._keyframe_offsets) - 1)
+        while True:
+            kind, payload, next_offset = self._record_at(self._keyframe_offsets[slot])
+            if slot == 0 or ELAPSED.unpack_from(payload, 0)[0] <= elapsed:
+                break
+            slot -= 1
+        state = RunState(self.elevator_count, self.floor_count)
+        state.apply(kind, payload)
+        return state, next_offset
+
+    def _record_at(self, offset):
+        kind, length = RECORD_HEADER.unpack_from(self._mm, offset)
+        start = offset + RECORD_HEADER.size
+        return kind, memoryview(self._mm)[start:start + length], start + length
+
+    def _records(self, offset):
+        while offset + RECORD_HEADER.size <= self._end:
+            kind, length = RECORD_HEADER.unpack_from(self._mm, offset)
+            if offset + RECORD_HEADER.size + length > self._end:
+                # Cut off in the middle of a record.
+                return
+            record_offset = offset
+            kind, payload, offset = self._record_at(offset)
+            yield record_offset, kind, payload
+
+
+class ReplayBuilding(Building):
+    """A building that shows a recorded state (see show()) rather than simulating anything, so it can be drawn."""
+
+    def __init__(self, recording, message_width=40):
+        super().__init__(recording.elevator_count, recording.floor_count, message_width, name=recording.name)
+        self.elevators = [_ReplayElevator(n) for n in range(recording.elevator_count)]
+        self.floors = [_ReplayFloor(n) for n in range(recording.floor_count)]
+
+    def show(self, state):
+        for elevator, (position, status, rider_count) in zip(self.elevators, state.elevators):
+            elevator.show(position, status, rider_count)
+        for floor, (up, down) in zip(self.floors, state.floors):
+            floor.show(up + down)
+        self._messages = state.messages
+
+
+class _ReplayElevator(Elevator):
+
+    def show(self, position, status, rider_count):
+        self._place(position, 0)
+        self._status = status
+        self._rider_count = rider_count
+
+
+class _ReplayFloor(Floor):
+
+    def __init__(self, number):
+        super().__init__(number)
+        self._waiting_count = 0
+
+    @property
+    def waiting_count(self):
+        return self._waiting_count
+
+    def show(self, waiting_count):
+        self._waiting_count = waiting_count
+
+
+def _pack_message(message):
+    elapsed, origin, text = message
+    text = str(text).encode()[:0xffff]
+    return MESSAGE_HEAD.pack(elapsed, origin.encode()[:3], len(text)) + text
+
+
+def _describe_rider_event(event):
+    kind, rider_num, a, b = event
+    if kind == 'new':
+        return f'R{rider_num} shows up on floor {a}, going to {b}'
+    elif kind == 'boarded':
+        return f'R{rider_num} gets on Ev{a} on floor {b}'
+    return f'R{rider_num} gets off on floor {a}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Look at runs recorded with run.py --record-run')
+    parser.add_argument('command', choices=('info', 'show', 'play'),
+                        help='info: what the recording has in it; show: the building at one second, and what '
+                             'happened to riders then; play: the run, from one second on')
+    parser.add_argument('path', type=str)
+    parser.add_argument('--at', type=int, default=0, help='second to show, or to start playing from')
+    parser.add_argument('--msgwidth', type=int, default=40, help='how wide should the message area be?')
+    parser.add_argument('--speedup', type=float, default=4,
+                        help='play this many times faster than real world ("inf" for as fast as possible)')
+    parser.add_argument('--to', type=int, help='second to stop playing at')
+    args = parser.parse_args()
+
+    with Recording(args.path) as recording:
+        if args.command == 'info':
+            print(f'{recording.name}: {recording.elevator_count} elevators, {recording.floor_count} floors, '
+                  f'seconds 0 to {recording.last_elapsed}, a keyframe every {recording.keyframe_interval} seconds, '
+                  f'{os.path.getsize(args.path)} bytes')
+        elif args.command == 'show':
+            state = recording.state_at(args.at)
+            if state is None:
+                parser.error(f'the recording ends before second {args.at}')
+            building = ReplayBuilding(recording, message_width=args.msgwidth)
+            building.show(state)
+            print('\n'.join(building.frame(state.elapsed)))
+            for event in state.rider_events:
+                print(_describe_rider_event(event))
+        else:
+            building = ReplayBuilding(recording, message_width=args.msgwidth)
+            renderer = TerminalRenderer()
+            elapsed = None
+            for state in recording.play(args.at, args.to):
+                building.show(state)
+                renderer.render(building, state.elapsed)
+                elapsed = state.elapsed
+                time.sleep(1 / args.speedup)
+            if elapsed is not None:
+                # Frames get skipped when playing faster than the frame rate, so make sure the last one gets drawn.
+                renderer.render(building, elapsed, force=True)
@@ -0,0 +1,218 @@
+import collections
+import multiprocessing
+import traceback
+
+from elevator import Elevator
+from errors import ControllerCrashed
+from floor import Floor
+from rider import Rider
+from state import state_view_for, update_controller
+
+# The elevator methods a controller can call, which is to say the commands that can come back from its process.
+COMMANDS = ('go_down', 'go_up', 'open_doors_and_board_riders', 'open_doors_to_disembark')
+
+# Floors can't be sent between processes, so event arguments that are floors get sent as one of these instead.
+_FloorRef = collections.namedtuple('_FloorRef', ('number',))
+
+
+class RemoteController:
+    """Runs an ordinary controller in a process of its own, so that it can't take the simulation down with it when it
+    crashes, and so that several simulations' controllers can work on several cores. Use it in place of the
+    controller itself: RemoteController(SomeController, building) instead of SomeController(building.elevators,
+    building.floors). The controller class has to be importable from the other process.
+
+    Over there, the controller gets stand-in elevators and floors. Once per game second (in update()), the
+    simulation sends it one snapshot of where the elevators are, what they're doing, how many riders they have, who's
+    waiting on any floors that changed, and the events fired since the last snapshot (just the ones the controller
+    has handlers for). The controller's handlers and update() run against the stand-ins, and everything they told the
+    elevators to do comes back in one batch, to be done to the real ones. Since events get delivered at the start of
+    the next second rather than right away, handlers can see riders who've shown up in the meantime."""
+
+    def __init__(self, controller_class, building):
+        self._building = building
+        self._events = []
+        self._floor_keys = [None] * len(building.floors)
+        self._last_elapsed = 0
+        self._subscribed = set()
+        self._connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_host, daemon=True,
+                                                args=(child_connection, controller_class,
+                                                      [e.speed for e in building.elevators], len(building.floors)))
+        self._process.start()
+        child_connection.close()
+        # Controllers get to boss the elevators around from __init__, too.
+        subscriptions, commands = self._receive()
+        self._subscribe(subscriptions)
+        self._perform(commands)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        if self._process is None:
+            return
+        try:
+            self._connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._connection.close()
+        self._process.join(1)
+        if self._process.is_alive():
+            self._process.kill()
+        self._process = None
+
+    def update(self, elapsed, elevators, floors):
+        elevator_states = [(e.position, e._run_floors, e.status, e.rider_count) for e in elevators]
+        changed_floors = []
+        for f in floors:
+            up, down = f.riders_waiting_up, f.riders_waiting_down
+            # Riders only ever join the ends of these lists, with ever-higher numbers, and leave all at once, so
+            # this is enough to tell whether anything changed.
+            key = (len(up), up[-1].number if up else 0, len(down), down[-1].number if down else 0)
+            if key != self._floor_keys[f.number]:
+                self._floor_keys[f.number] = key
+                changed_floors.append((f.number, [(r.number, r.destination_floor_num) for r in up],
+                                       [(r.number, r.destination_floor_num) for r in down]))
+        events, self._events = self._events, []
+        try:
+            self._connection.send((elapsed, elevator_states, changed_floors, events))
+        except (BrokenPipeError, OSError):
+            raise ControllerCrashed('controller process died')
+        subscriptions, commands, handler_messages, message = self._receive()
+        for origin, msg in handler_messages:
+            self._building.add_message(origin, self._last_elapsed, msg)
+        self._last_elapsed = elapsed
+        self._subscribe(subscriptions)
+        self._perform(commands)
+        return message
+
+    def _forward(self, event_name):
+        def forward(source, *args):
+            kind = 'E' if isinstance(source, Elevator) else 'F'
+            self._events.append((kind, source.number, event_name,
+                                 tuple(_FloorRef(a.number) if isinstance(a, Floor) else a for a in args)))
+        return forward
+
+    def _perform(self, commands):
+        for elevator_num, command, args in commands:
+            if command not in COMMANDS:
+                raise ControllerCrashed(f'controller process sent unknown command "{command}"')
+            getattr(self._building.elevators[elevator_num], command)(*args)
+
+    def _receive(self):
+        try:
+            reply = self._connection.recv()
+        except (EOFError, OSError):
+            raise ControllerCrashed('controller process died')
+        if reply[0] == 'error':
+            raise ControllerCrashed(f'controller raised an exception in its process:\n{reply[1]}')
+        return reply[1:]
+
+    def _subscribe(self, subscriptions):
+        for kind, number, event_name in subscriptions:
+            if (kind, number, event_name) not in self._subscribed:
+                self._subscribed.add((kind, number, event_name))
+                source = (self._building.elevators if kind == 'E' else self._building.floors)[number]
+                source.on(event_name, self._forward(event_name))
+
+
+class _StandInElevator(Elevator):
+    """An elevator on the controller's side, which takes note of what it's told to do."""
+
+    def __init__(self, number, speed, commands):
+        super().__init__(number, speed=speed)
+        self._commands = commands
+
+    def go_down(self):
+        super().go_down()
+        self._commands.append((self.number, 'go_down', ()))
+
+    def go_up(self):
+        super().go_up()
+        self._commands.append((self.number, 'go_up', ()))
+
+    def open_doors_and_board_riders(self, going_up):
+        super().open_doors_and_board_riders(going_up)
+        self._commands.append((self.number, 'open_doors_and_board_riders', (going_up,)))
+
+    def open_doors_to_disembark(self):
+        super().open_doors_to_disembark()
+        self._commands.append((self.number, 'open_doors_to_disembark', ()))
+
+    def catch_up(self, position, run_floors, status, rider_count):
+        self._place(position, run_floors)
+        self._status = status
+        self._rider_count = rider_count
+
+
+class _StandInFloor(Floor):
+
+    def catch_up(self, going_up, going_down):
+        self._riders_going_up = [self._stand_in_rider(n, d) for (n, d) in going_up]
+        self._riders_going_down = [self._stand_in_rider(n, d) for (n, d) in going_down]
+
+    def _stand_in_rider(self, number, destination_floor_num):
+        rider = Rider(self.number, destination_floor_num)
+        rider.number = number
+        return rider
+
+
+def _host(connection, controller_class, speeds, floor_count):
+    """What the controller's process does: set up stand-ins and the controller, then answer snapshots with commands
+    until told to stop (with None)."""
+    try:
+        commands = []
+        elevators = [_StandInElevator(n, speed, commands) for (n, speed) in enumerate(speeds)]
+        floors = [_StandInFloor(0, has_down_button=False)]
+        floors.extend(_StandInFloor(n) for n in range(floor_count)[1:-1])
+        floors.append(_StandInFloor(floor_count - 1, has_up_botton=False))
+        controller = controller_class(elevators, floors)
+        state_view = state_view_for(controller, elevators, floors)
+
+        subscribed = set()
+
+        def new_subscriptions():
+            subscriptions = [(kind, source.number, name)
+                             for (kind, sources) in (('E', elevators), ('F', floors)) for source in sources
+                             for name in source.EVENT_NAMES if source.has_handlers(name)]
+            fresh = [s for s in subscriptions if s not in subscribed]
+            subscribed.update(fresh)
+            return fresh
+
+        connection.send(('ready', new_subscriptions(), commands[:]))
+        while True:
+            snapshot = connection.recv()
+            if snapshot is None:
+                break
+            elapsed, elevator_states, changed_floors, events = snapshot
+            commands.clear()
+            for elevator, state in zip(elevators, elevator_states):
+                elevator.catch_up(*state)
+            for floor_num, going_up, going_down in changed_floors:
+                floors[floor_num].catch_up(going_up, going_down)
+
+            handler_messages = []
+            for kind, number, event_name, args in events:
+                source = (elevators if kind == 'E' else floors)[number]
+                args = tuple(floors[a.number] if isinstance(a, _FloorRef) else a for a in args)
+                origin = f'Ev{number}' if kind == 'E' else f'F{number}'
+                handler_messages.extend((origin, _text(m)) for m in source.notify(event_name, *args))
+            message = _text(update_controller(controller, elapsed, elevators, floors, state_view))
+            connection.send(('ok', new_subscriptions(), commands[:], handler_messages, message))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception:
+        try:
+            connection.send(('error', traceback.format_exc()))
+        except (BrokenPipeError, OSError):
+            pass
+    finally:
+        connection.close()
+
+
+def _text(msg):
+    """Messages can be functions that return the message (see Building.add_message), but those can't be sent."""
+    return msg() if callable(msg) else msg
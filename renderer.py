@@ -0,0 +1,56 @@
+import sys
+import time
+
+
+class TerminalRenderer:
+    """Draws frames of the building (see Building.frame) to the terminal, but instead of reprinting the whole thing
+    every time, it only rewrites the parts of lines that changed since the last frame it drew, all in one write. It
+    also skips frames that come along faster than max_fps, so the simulation can run as fast as it likes without
+    waiting on the terminal."""
+
+    def __init__(self, out=sys.stdout, max_fps=30):
+        self._last_drawn_at = None
+        self._last_rows = None
+        self._min_interval = 1 / max_fps if max_fps else 0
+        self._out = out
+
+    def render(self, building, elapsed, force=False):
+        """Draw the building as of `elapsed` seconds, unless it's too soon since the last frame (and not forced).
+        Returns whether anything was drawn."""
+        now = time.monotonic()
+        if not force and self._last_drawn_at is not None and now - self._last_drawn_at < self._min_interval:
+            return False
+        self._last_drawn_at = now
+
+        rows = building.frame(elapsed)
+        if self._last_rows is None or len(rows) != len(self._last_rows):
+            self._out.write('\n'.join(rows) + '\n')
+        else:
+            self._out.write(self._changes(self._last_rows, rows))
+        self._out.flush()
+        self._last_rows = rows
+        return True
+
+    @staticmethod
+    def _changes(old_rows, new_rows):
+        """Terminal output that turns old_rows into new_rows, starting and ending with the cursor on the line just
+        below the frame."""
+        parts = [f'\033[{len(new_rows)}A']
+        cursor_row = 0
+        for row_num, (old, new) in enumerate(zip(old_rows, new_rows)):
+            if old == new:
+                continue
+            start = next((i for i, (a, b) in enumerate(zip(old, new)) if a != b), min(len(old), len(new)))
+            if row_num > cursor_row:
+                parts.append(f'\033[{row_num - cursor_row}B')
+                cursor_row = row_num
+            parts.append(f'\033[{start + 1}G')
+            if len(old) == len(new):
+                end = len(new) - next(i for i, (a, b) in enumerate(zip(reversed(old), reversed(new))) if a != b)
+                parts.append(new[start:end])
+            else:
+                parts.append(new[start:])
+                if len(new) < len(old):
+                    parts.append('\033[K')
+        parts.append(f'\033[{len(new_rows) - cursor_row}B\r')
+        return ''.join(parts)
@@ -3,10 +3,16 @@ from events import EventSource
 
 class Rider(EventSource):
 
+    # There can be an awful lot of riders, so they don't get a __dict__.
+    __slots__ = ('destination_floor_num', 'in_elevator', 'number', 'start_floor_num', 'started_waiting', 'trip_end',
+                 'trip_start')
+
+    EVENT_NAMES = ('reached_destination',)
+
     last_number = 0
 
     def __init__(self, start, destination):
-        super().__init__(('reached_destination',))
+        super().__init__()
         self.destination_floor_num = destination
         self.in_elevator = None
         self.start_floor_num = start
@@ -16,3 +22,16 @@ class Rider(EventSource):
 
         Rider.last_number += 1
         self.number = Rider.last_number
+
+    def copy(self):
+        """A twin of this rider (same number and all), but with no event handlers or pending events."""
+        twin = Rider.__new__(Rider)
+        EventSource.__init__(twin)
+        twin.destination_floor_num = self.destination_floor_num
+        twin.in_elevator = self.in_elevator
+        twin.number = self.number
+        twin.start_floor_num = self.start_floor_num
+        twin.started_waiting = self.started_waiting
+        twin.trip_end = self.trip_end
+        twin.trip_start = self.trip_start
+        return twin
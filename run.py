@@ -1,26 +1,39 @@
 #!/usr/local/bin/python
 import argparse
-import importlib
-import inspect
-import re
-import sys
+import asyncio
+import json
+import os
+import random
 import time
 
+from async_game import POLICIES, async_game_loop, simulate_async_headless
+from budget import TimeBudget
 from building import Building
+from cache import ResultCache, cache_key
+from elevator import SpeedProfile
 from errors import GameplayError
+from game import (default_scenarios, game_loop, import_scenarios, load_controller_class, scenario_pairs_in_source_order,
+                  simulate_headless)
+from instrumentation import Profiler
+from metrics import MetricsCollector
+from recording import Recorder
+from remote import RemoteController
+from renderer import TerminalRenderer
 from scenarios import Scenario
+from traces import ReplayTrace, TraceWriter
 
-SCENARIO_CLASS_REGEX = re.compile(r'^class (\w+)\(Scenario\):$')
 
+def call_all(functions):
+    """One after_tick function that calls all of these, in order (or None, if there aren't any)."""
+    if not functions:
+        return None
+    elif len(functions) == 1:
+        return functions[0]
 
-def get_elevator_positions(building):
-    return [e.floor_num for e in building.elevators]
-
-
-def import_scenarios():
-    mod = sys.modules['scenarios']
-    return {nm:clz for (nm, clz) in
-            inspect.getmembers(mod, inspect.isclass) if nm != 'Scenario' and issubclass(clz, Scenario)}
+    def call(elapsed):
+        for f in functions:
+            f(elapsed)
+    return call
 
 
 def nope(error):
@@ -49,46 +62,83 @@ def print_messages(building):
     print(dashes, 'messages end', dashes)
 
 
-def simulate(scenario, building, controller, speedup, force_duration=None):
-    elapsed = 0
+def per_scenario_path(path, scenario_name, scenario_count):
+    """When running several scenarios, each one gets its own file, named after the scenario."""
+    if scenario_count == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}-{scenario_name}{ext}'
+
+
+def parse_speeds(text):
+    """Turn something like "4,2/3/4" into a SpeedProfile per elevator. Each one is seconds per floor, optionally
+    preceded by how long each of the first few floors after setting off takes, separated by slashes: "2/3/4" takes
+    4 seconds for the first floor, 3 for the second and 2 for every one after that."""
+    speeds = []
+    for spec in text.split(','):
+        seconds = [int(n) for n in spec.split('/')]
+        speeds.append(SpeedProfile(seconds[0], ramp=reversed(seconds[1:])))
+    return speeds
+
+
+def print_score(score):
+    print(f'SCORE: finished rides                   = {score["finished_rides"]}')
+    print(f'       unfinished rides                 = {score["unfinished_rides"]}')
+    print(f'       average wait for elevator        = {score["average_wait"]} seconds')
+    print(f'       average trip time                = {score["average_trip"]} seconds')
+    print(f'       trip efficiency score (1 - 100)  = {score["trip_efficiency"]}')
+    if 'controller_seconds' not in score:
+        # The controller wasn't timed (see budget.TimeBudget).
+        return
+    print(f'       time spent in controller         = {score["controller_seconds"]} seconds')
+    if score['missed_ticks'] or score['budget_overrun']:
+        print(f'       seconds over per-second budget   = {score["missed_ticks"]}')
+        print(f'       time spent over budget           = {score["budget_overrun"]} seconds')
+
+
+def simulate(scenario, building, controller, speedup, force_duration=None, fps=30, profiler=None, async_policy=None,
+             after_tick=None):
+    """With an async_policy (see async_game.py), the controller's update() and handlers can be coroutines. An
+    after_tick function gets called at the end of every second, before the building's drawn."""
+    renderer = TerminalRenderer(max_fps=fps)
+    last_tick = []
+
+    def draw(elapsed):
+        if after_tick is not None:
+            after_tick(elapsed)
+            if profiler is not None:
+                profiler.lap('after_tick')
+        renderer.render(building, elapsed)
+        if profiler is not None:
+            profiler.lap('draw')
+        last_tick[:] = [elapsed]
+
+    def draw_and_wait(elapsed):
+        draw(elapsed)
+        time.sleep(1 / speedup)
+
+    async def draw_and_await(elapsed):
+        draw(elapsed)
+        await asyncio.sleep(1 / speedup)
+
     try:
-        elevator_positions = get_elevator_positions(building)
-        positions_last_changed = 0
-        while True:
-            scenario.update(elapsed, building)
-            should_continue = scenario.should_continue(elapsed, building)
-            if should_continue != Scenario.CONTINUE:
-                if should_continue != Scenario.TIMED_OUT or force_duration is None or elapsed >= force_duration:
-                    print_conclusion(should_continue, elapsed)
-                    break
-            elif force_duration is not None and force_duration < elapsed:
-                print_conclusion(Scenario.TIMED_OUT, elapsed)
-                break
-            msg = controller.update(elapsed, building.elevators, building.floors)
-            if msg is not None:
-                building.add_message('Ctr', elapsed, msg)
-            building.update_all(elapsed)
-            building.notify_all(elapsed)
-            building.draw(elapsed)
-
-            positions_now = get_elevator_positions(building)
-            if positions_now != elevator_positions:
-                elevator_positions = positions_now
-                positions_last_changed = elapsed
-            elif positions_last_changed < elapsed - 10:
-                print_conclusion(Scenario.STUCK, elapsed)
-                break
-
-            time.sleep(1 / speedup)
-            elapsed += 1
+        if async_policy is None:
+            conclusion, elapsed = game_loop(scenario, building, controller, force_duration=force_duration,
+                                            after_tick=draw_and_wait, profiler=profiler)
+        else:
+            conclusion, elapsed = asyncio.run(async_game_loop(scenario, building, controller,
+                                                              force_duration=force_duration,
+                                                              after_tick=draw_and_await, policy=async_policy))
+        if last_tick:
+            # Frames get skipped when the simulation outruns the frame rate, so make sure the last one gets drawn.
+            renderer.render(building, last_tick[0], force=True)
+        print_conclusion(conclusion, elapsed)
         print()
         score = building.score(elapsed)
-        print(f'SCORE: finished rides                   = {score["finished_rides"]}')
-        print(f'       unfinished rides                 = {score["unfinished_rides"]}')
-        print(f'       average wait for elevator        = {score["average_wait"]} seconds')
-        print(f'       trip efficiency score (1 - 100)  = {score["trip_efficiency"]}')
+        print_score(score)
         print()
         print_messages(building)
+        return score
     except GameplayError as ge:
         print()
         print(f'GAMEPLAY ERROR: {str(ge)}')
@@ -103,47 +153,88 @@ def simulate(scenario, building, controller, speedup, force_duration=None):
         raise ex
 
 
-def scenario_pairs_in_source_order(scenarios):
-    result = []
-    with open('scenarios.py', 'rt') as f:
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            m = SCENARIO_CLASS_REGEX.match(line.rstrip())
-            if m and m[1] in scenarios:
-                result.append((m[1], scenarios[m[1]]))
-    return result
-
-
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Fun elevator game (rip-off of the excellent Elevator Saga)')
     parser.epilog = 'The "controller" argument must be the beginning of the source file name for a controller ' \
                     '("dumb" --> dumb_controller.py). The source file has to contain a class, and the name of the ' \
                     'class has to end with "Controller."'
     parser.add_argument('controller', type=str, nargs=1, help='controller file name prefix (see below)')
+    parser.add_argument('--async', dest='async_policy', choices=POLICIES,
+                        help='let the controller\'s update() and handlers be coroutines; when one is still running at '
+                             'the end of a game second, either "block" the simulation until it\'s done or '
+                             '"continue" without it')
+    parser.add_argument('--budget-policy', choices=TimeBudget.POLICIES, default=TimeBudget.WARN,
+                        help='what to do when the controller goes over --tick-budget or --run-budget: just "warn", '
+                             '"skip" its turns until it catches up, or "fail" the scenario (default: warn)')
     parser.add_argument('--duration', type=int, nargs='?', help='force the game to simulate this many seconds')
     parser.add_argument('--elevators', type=int, default=3, help='number of elevators in building')
+    parser.add_argument('--event-driven', action='store_true',
+                        help='with --headless, skip straight over seconds in which nothing happens')
     parser.add_argument('--floors', type=int, default=5,
                         help='building height (needs to fit in your terminal window!)')
+    parser.add_argument('--fps', type=float, default=30,
+                        help='redraw the building at most this many times per (real) second')
+    parser.add_argument('--headless', action='store_true',
+                        help="don't draw the building; run as fast as possible and just print the scores")
     parser.add_argument('--list', action='store_true', help='list scenario names and then quit')
+    parser.add_argument('--message-limit', type=int, default=Building.MESSAGE_LIMIT,
+                        help='only keep this many of the latest messages to print at the end (default: %(default)s)')
+    parser.add_argument('--message-log', type=str, help='write every message, full length, to this file as it happens')
+    parser.add_argument('--metrics', action='store_true',
+                        help='after each scenario, print percentiles of wait and trip times, how riders queued up '
+                             'and how busy the elevators were')
+    parser.add_argument('--metrics-json', type=str,
+                        help='save those metrics, with minute-by-minute queue lengths and elevator statuses, to this '
+                             'JSON file')
     parser.add_argument('--msgwidth', type=int, default=40, help='how wide should the message area be?')
     parser.add_argument('--only', type=str, nargs='?', help='only run these scenarios')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each part of the simulation and the controller\'s event handlers, and print a '
+                             'summary')
+    parser.add_argument('--profile-trace', type=str,
+                        help='with --profile, also write the timings for every game second to this CSV file')
+    parser.add_argument('--record', type=str,
+                        help='save the riders in each scenario to this trace file (named per scenario if several)')
+    parser.add_argument('--record-run', type=str,
+                        help='record everything that happens, second by second, to this file, for watching later '
+                             'with recording.py')
+    parser.add_argument('--remote', action='store_true',
+                        help='run the controller in a separate process, so a crash can\'t take the simulation with it')
+    parser.add_argument('--replay', type=str,
+                        help='instead of the usual scenarios, replay the riders in this trace file')
+    parser.add_argument('--rerun', action='store_true',
+                        help='with --headless and --seed, simulate every scenario even if its score is cached')
+    parser.add_argument('--run-budget', type=float,
+                        help='real-world seconds the controller may spend over a whole scenario')
+    parser.add_argument('--seed', type=int,
+                        help='seed the random number generator with this before each scenario, for repeatable runs '
+                             '(headless runs with a seed get their scores cached, and reused if nothing has changed)')
+    parser.add_argument('--speeds', type=str,
+                        help='comma-separated speed of each elevator, in seconds per floor (default: 4 for all); '
+                             'seconds for the first floors after setting off can be added in front, with slashes, so '
+                             '"2/3/4" takes 4 seconds, then 3, then 2 for every floor after that')
     parser.add_argument('--speedup', type=float, default=4,
-                        help='simulation runs this many times faster than real world')
+                        help='simulation runs this many times faster than real world ("inf" for as fast as possible)')
+    parser.add_argument('--tick-budget', type=float,
+                        help='real-world milliseconds the controller may spend in any one game second')
     parser.add_argument('--trace-riders', action='store_true', help='generate debug messages describing rider actions')
 
     args = parser.parse_args()
+    if args.async_policy is not None and (args.event_driven or args.profile or args.tick_budget or args.run_budget):
+        nope('--async works on its own, without --event-driven, --profile or time budgets.')
+    if (args.record_run or args.metrics or args.metrics_json) and (args.event_driven or args.async_policy is not None):
+        nope("--record-run and metrics need every second played, so they can't be used with --event-driven or "
+             "--async.")
     scenarios = import_scenarios()
 
     if args.list:
-        print('\n'.join(scenarios.keys()))
+        print('\n'.join(nm + ('' if clz.PLAYED_BY_DEFAULT else ' (only with --only)') for (nm, clz) in
+                        scenario_pairs_in_source_order(scenarios)))
         exit(0)
 
     modname = f'{args.controller[0]}_controller'
     try:
-        mod = importlib.import_module(modname)
-        clazz = next(clz for (nm, clz) in inspect.getmembers(mod, inspect.isclass) if nm.endswith('Controller'))
+        clazz = load_controller_class(args.controller[0])
     except ModuleNotFoundError:
         nope(f"It doesn't look like there's a {modname}.py file in this directory.")
     except StopIteration:
@@ -151,17 +242,128 @@ if __name__ == '__main__':
 
     if args.only:
         scenarios = {args.only: scenarios[args.only]}
+    else:
+        scenarios = default_scenarios()
+
+    speeds = None
+    if args.speeds:
+        try:
+            speeds = parse_speeds(args.speeds)
+        except ValueError as e:
+            nope(f'Bad --speeds: {e}')
+        if len(speeds) != args.elevators:
+            nope(f'--speeds gives {len(speeds)} speeds for {args.elevators} elevators.')
 
-    scenario_list = scenario_pairs_in_source_order(scenarios)
+    if args.replay:
+        scenario_list = [('ReplayTrace', lambda building: ReplayTrace(building, args.replay))]
+    else:
+        scenario_list = scenario_pairs_in_source_order(scenarios)
+
+    message_log = None if args.message_log is None else open(args.message_log, 'wt', buffering=1024 * 1024)
+    tick_budget = None if args.tick_budget is None else args.tick_budget / 1000
+    # Scores can only be reused when the run is repeatable and there's nothing to it but the score. (Async
+    # controllers can come out differently every time, depending on how long the things they await take, and so
+    # can budgeted ones, depending on how fast they happen to run.)
+    result_cache = None
+    if args.headless and args.seed is not None and not (args.replay or args.record or args.record_run or
+                                                         args.profile or args.message_log or args.trace_riders or
+                                                         args.metrics or args.metrics_json or
+                                                         args.async_policy is not None or
+                                                         tick_budget is not None or args.run_budget is not None):
+        result_cache = ResultCache()
 
     for scenario_name, scenario in scenario_list:
+        if result_cache is not None:
+            key = cache_key(modname, scenario, seed=args.seed, elevators=args.elevators, floors=args.floors,
+                            duration=args.duration, tick_budget=tick_budget, run_budget=args.run_budget,
+                            budget_policy=args.budget_policy, speeds=args.speeds, remote=args.remote)
+            score = None if args.rerun else result_cache.get(key)
+            if score is not None:
+                print(f'====== {scenario_name} ====== (cached)')
+                print_score(score)
+                print()
+                continue
+        if args.seed is not None:
+            random.seed(args.seed)
+        if message_log is not None:
+            message_log.write(f'====== {scenario_name} ======\n')
         building = Building(elevator_count=args.elevators,
                             floor_count=args.floors,
                             message_width=args.msgwidth,
                             name=scenario_name,
-                            trace_riders=args.trace_riders)
-        controller = clazz(building.elevators, building.floors)
-        scenario = scenario(building)
+                            trace_riders=args.trace_riders,
+                            message_limit=0 if args.headless else args.message_limit,
+                            message_log=message_log,
+                            speeds=speeds)
+        if args.remote:
+            remote_controller = controller = RemoteController(clazz, building)
+        else:
+            controller = clazz(building.elevators, building.floors)
+        if tick_budget is not None or args.run_budget is not None:
+            # Without a budget, the controller isn't timed at all, so that it doesn't pay for the timing.
+            controller = TimeBudget(controller, building, policy=args.budget_policy, per_run=args.run_budget,
+                                    per_tick=tick_budget)
+        try:
+            scenario = scenario(building)
+        except ValueError as e:
+            nope(f"Can't play {scenario_name}: {e}.")
+        trace_writer = None
+        if args.record:
+            trace_writer = TraceWriter(per_scenario_path(args.record, scenario_name, len(scenario_list)))
+            building.add_rider_listener(trace_writer.record_rider)
+        after_ticks = []
+        recorder = None
+        if args.record_run:
+            recorder = Recorder(per_scenario_path(args.record_run, scenario_name, len(scenario_list)), building)
+            after_ticks.append(recorder.record)
+        metrics_collector = None
+        if args.metrics or args.metrics_json:
+            metrics_collector = MetricsCollector(building)
+            after_ticks.append(metrics_collector.sample)
+        profiler = None
+        if args.profile:
+            profiler = Profiler(building, trace_path=(None if args.profile_trace is None else
+                                                      per_scenario_path(args.profile_trace, scenario_name,
+                                                                        len(scenario_list))))
+            if after_ticks and args.headless:
+                # (simulate() times them itself, apart from drawing.)
+                after_ticks.append(lambda _: profiler.lap('after_tick'))
+
+        if args.headless:
+            print(f'====== {scenario_name} ======')
+            if args.async_policy is not None:
+                print_score(simulate_async_headless(scenario, building, controller, force_duration=args.duration,
+                                                    policy=args.async_policy))
+            else:
+                score = simulate_headless(scenario, building, controller, force_duration=args.duration,
+                                          event_driven=args.event_driven, profiler=profiler,
+                                          after_tick=call_all(after_ticks))
+                if result_cache is not None:
+                    result_cache.put(key, score)
+                print_score(score)
+            print()
+        else:
+            simulate(scenario, building, controller, args.speedup,
+                     force_duration=(None if args.duration is None else args.duration), fps=args.fps,
+                     profiler=profiler, async_policy=args.async_policy, after_tick=call_all(after_ticks))
+        if trace_writer is not None:
+            trace_writer.close()
+        if recorder is not None:
+            recorder.close()
+        if args.remote:
+            remote_controller.close()
+        if profiler is not None:
+            profiler.close()
+            print(profiler.summary())
+            print()
+        if metrics_collector is not None:
+            run_metrics = metrics_collector.finish()
+            if args.metrics:
+                print(run_metrics.summary())
+                print()
+            if args.metrics_json:
+                with open(per_scenario_path(args.metrics_json, scenario_name, len(scenario_list)), 'wt') as f:
+                    json.dump(run_metrics.to_dict(), f)
 
-        simulate(scenario, building, controller, args.speedup,
-                 force_duration=(None if args.duration is None else args.duration))
+    if message_log is not None:
+        message_log.close()
@@ -1,3 +1,4 @@
+import math
 import random
 
 from elevator import Elevator
@@ -9,6 +10,10 @@ class Scenario:
     TIMED_OUT = 2
     STUCK = 3
 
+    # Scenarios that take a long time to play only get played when they're asked for by name (see
+    # game.default_scenarios()).
+    PLAYED_BY_DEFAULT = True
+
     def __init__(self):
         self._done = False
         self._max_duration = 60 * 2
@@ -33,6 +38,12 @@ class Scenario:
     def min_building_height(self, value):
         self._min_building_height = value
 
+    def next_update(self, elapsed):
+        """The earliest second (no earlier than `elapsed`) in which calling update() might do anything, or None if
+        it never will again. The event-driven game loop uses this to skip over quiet stretches; scenarios that
+        can't predict their own behavior should just leave this alone."""
+        return elapsed
+
     def should_continue(self, elapsed, building):
         if self._done:
             return self.COMPLETED
@@ -48,6 +59,9 @@ class OneGuyGoesUp(Scenario):
         super().__init__()
         self.max_duration = Elevator.calculate_optimal_trip(0, len(building.floors) - 1) + 2
 
+    def next_update(self, elapsed):
+        return 0 if elapsed == 0 else None
+
     def update(self, elapsed, building):
         if elapsed == 0:
             rider = building.new_rider(0, len(building.floors) - 1, elapsed)
@@ -64,21 +78,145 @@ class TenRandomRides(Scenario):
         self.max_duration = 10 * Elevator.calculate_optimal_trip(0, self.building_height - 1)
         self.riders_finished = 0
         self.riders_started = 0
+        self._next_ride_at = 0
 
     def handle_ride_finished(self, _):
         self.riders_finished += 1
         if self.riders_finished == 10:
             self.finished()
 
+    def next_update(self, elapsed):
+        return None if self.riders_started == 10 else self._next_ride_at
+
     def update(self, elapsed, building):
-        if self.riders_started == 10:
+        if self.riders_started == 10 or elapsed < self._next_ride_at:
             return
 
-        if not self.riders_started or random.random() < self.RIDE_START_CHANCE_PER_SECOND:
-            start = end = random.randint(0, self.building_height - 1)
-            while end == start:
-                end = random.randint(0, self.building_height - 1)
+        start = end = random.randint(0, self.building_height - 1)
+        while end == start:
+            end = random.randint(0, self.building_height - 1)
+        rider = building.new_rider(start, end, elapsed)
+        rider.started_waiting = elapsed
+        rider.on('reached_destination', self.handle_ride_finished)
+        self.riders_started += 1
+
+        if self.riders_started < 10:
+            # Roll the dice for each second to come, right now, so we know when the next ride starts.
+            self._next_ride_at = elapsed + 1
+            while random.random() >= self.RIDE_START_CHANCE_PER_SECOND:
+                self._next_ride_at += 1
+
+
+class TrafficScenario(Scenario):
+    """Lots of riders, showing up at random like real people do: as a Poisson process, at a rate that can change
+    over time. At its busiest, riders_per_minute of them show up per minute, and how busy it is the rest of the time
+    is up to rate(), which subclasses override. Each rider is one of three kinds, in proportions that mix() decides
+    (and that can also change over time): "incoming" riders go from the lobby (the ground floor) up to some other
+    floor, "outgoing" ones go from some other floor down to the lobby, and "interfloor" ones go between two floors
+    other than the lobby.
+
+    Riders keep showing up for `duration` seconds, and then the scenario gives everyone time to finish. The whole
+    schedule gets worked out in advance, from the seed (or, without one, from the random module, so that
+    random.seed() still makes runs repeatable). Traffic scenarios need a lobby and at least two floors above it,
+    and they take a while, so they're only played when asked for by name."""
+
+    PLAYED_BY_DEFAULT = False
+
+    def __init__(self, building, riders_per_minute, duration=60 * 60, seed=None):
+        super().__init__()
+        self.duration = duration
+        self.min_building_height = 3
+        if len(building.floors) < self.min_building_height:
+            raise ValueError(f'{type(self).__name__} needs a building at least {self.min_building_height} floors '
+                             f'tall')
+        self.max_duration = duration + 10 * Elevator.calculate_optimal_trip(0, len(building.floors) - 1)
+        self.riders_finished = 0
+        self.riders_started = 0
+        rng = random.Random(random.getrandbits(64) if seed is None else seed)
+        self._schedule = self._make_schedule(rng, riders_per_minute / 60, len(building.floors))
+        self.rider_count = len(self._schedule)
+        self._schedule.reverse()
+
+    def handle_ride_finished(self, _):
+        self.riders_finished += 1
+        if self.riders_finished == self.rider_count:
+            self.finished()
+
+    def mix(self, elapsed):
+        """The relative numbers of incoming, outgoing and interfloor riders showing up at the given time."""
+        return 1, 1, 1
+
+    def next_update(self, elapsed):
+        return self._schedule[-1][0] if self._schedule else None
+
+    def rate(self, elapsed):
+        """How busy it is at the given time, from 0 (nobody's coming) to 1 (riders_per_minute)."""
+        return 1
+
+    def update(self, elapsed, building):
+        while self._schedule and self._schedule[-1][0] <= elapsed:
+            _, start, end = self._schedule.pop()
             rider = building.new_rider(start, end, elapsed)
             rider.started_waiting = elapsed
             rider.on('reached_destination', self.handle_ride_finished)
             self.riders_started += 1
+
+    def _make_schedule(self, rng, peak_per_second, floor_count):
+        """A list of (elapsed, start floor, destination floor), in order. Arrivals come at the peak rate and then
+        get thinned out to the rate of the moment."""
+        schedule = []
+        kinds = ('incoming', 'outgoing', 'interfloor')
+        elapsed = rng.expovariate(peak_per_second)
+        while elapsed < self.duration:
+            if rng.random() < self.rate(elapsed):
+                kind = rng.choices(kinds, weights=self.mix(elapsed))[0]
+                if kind == 'incoming':
+                    start, end = 0, rng.randrange(1, floor_count)
+                elif kind == 'outgoing':
+                    start, end = rng.randrange(1, floor_count), 0
+                else:
+                    start, end = rng.sample(range(1, floor_count), 2)
+                schedule.append((int(elapsed), start, end))
+            elapsed += rng.expovariate(peak_per_second)
+        return schedule
+
+
+class InterfloorTraffic(TrafficScenario):
+    """A steady stream of riders going every which way."""
+
+    def __init__(self, building, riders_per_minute=30, duration=60 * 60, seed=None):
+        super().__init__(building, riders_per_minute, duration=duration, seed=seed)
+
+
+class UpPeakTraffic(TrafficScenario):
+    """The morning rush: nearly everybody comes in at the lobby and goes up, picking up to a peak halfway through."""
+
+    def __init__(self, building, riders_per_minute=60, duration=60 * 60, seed=None):
+        super().__init__(building, riders_per_minute, duration=duration, seed=seed)
+
+    def mix(self, elapsed):
+        return 85, 5, 10
+
+    def rate(self, elapsed):
+        return 0.2 + 0.8 * math.sin(math.pi * elapsed / self.duration) ** 2
+
+
+class DownPeakTraffic(UpPeakTraffic):
+    """The evening rush: nearly everybody heads down to the lobby to go home."""
+
+    def mix(self, elapsed):
+        return 5, 85, 10
+
+
+class LunchTraffic(TrafficScenario):
+    """Everybody heading out for lunch, and then (with some overlap) everybody coming back."""
+
+    def __init__(self, building, riders_per_minute=50, duration=60 * 60, seed=None):
+        super().__init__(building, riders_per_minute, duration=duration, seed=seed)
+
+    def mix(self, elapsed):
+        returning = elapsed / self.duration
+        return 90 * returning, 90 * (1 - returning), 10
+
+    def rate(self, elapsed):
+        return 0.5 + 0.5 * math.sin(math.pi * elapsed / self.duration)
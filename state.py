@@ -0,0 +1,80 @@
+import array
+
+from elevator import Elevator
+
+
+class StateView:
+    """The state of the building as a handful of flat arrays, for controllers that would rather work on all the
+    elevators (or floors) at once than ask each one in turn: a dispatcher that scores every elevator against every
+    call with NumPy, say, or a learned policy that wants its input as numbers.
+
+    A controller asks for one by setting STATE_VIEW = True on its class. Then its update() gets called with a
+    state keyword argument, a StateView that's been brought up to date for that second:
+    - position: where each elevator is, in Elevator.UNITS_PER_FLOOR units above the ground floor (exact)
+    - floor_num: the same thing in floors, the way Elevator.floor_num has it
+    - status: each elevator's status (Elevator.IDLE and so on)
+    - rider_count: how many riders each elevator has on board
+    - waiting_up and waiting_down: how many riders on each floor are waiting to go up, and down
+    - elapsed: the second it's up to date for
+
+    It's the same StateView every second, and the arrays are rewritten in place rather than made anew, so holding
+    on to them (or to NumPy arrays made from them with numpy.asarray(), which share their memory) is fine: they
+    always show the current second. They're read-only memoryviews (in Python 3.8 and later, anyway); tell the
+    elevators what to do the usual way."""
+
+    def __init__(self, elevators, floors):
+        self.elapsed = None
+        self._elevators = elevators
+        self._floors = floors
+        self._floor_num = array.array('d', bytes(8 * len(elevators)))
+        self._position = array.array('q', bytes(8 * len(elevators)))
+        self._rider_count = array.array('q', bytes(8 * len(elevators)))
+        self._status = array.array('b', bytes(len(elevators)))
+        self._waiting_down = array.array('q', bytes(8 * len(floors)))
+        self._waiting_up = array.array('q', bytes(8 * len(floors)))
+        self.floor_num = _read_only(self._floor_num)
+        self.position = _read_only(self._position)
+        self.rider_count = _read_only(self._rider_count)
+        self.status = _read_only(self._status)
+        self.waiting_down = _read_only(self._waiting_down)
+        self.waiting_up = _read_only(self._waiting_up)
+
+    @property
+    def units_per_floor(self):
+        return Elevator.UNITS_PER_FLOOR
+
+    def refresh(self, elapsed):
+        """Copy the elevators' and floors' state into the arrays. The game loops do this just before calling the
+        controller's update(). It goes through every elevator and floor, changed or not, so it costs more the bigger
+        the building (see the README); the elevators and floors don't tell anyone when they change."""
+        self.elapsed = elapsed
+        floor_num, position, rider_count, status = self._floor_num, self._position, self._rider_count, self._status
+        for n, e in enumerate(self._elevators):
+            floor_num[n] = e.floor_num
+            position[n] = e.position
+            rider_count[n] = e.rider_count
+            status[n] = e.status
+        waiting_down, waiting_up = self._waiting_down, self._waiting_up
+        for n, f in enumerate(self._floors):
+            waiting_down[n] = len(f.riders_waiting_down)
+            waiting_up[n] = len(f.riders_waiting_up)
+
+
+def state_view_for(controller, elevators, floors):
+    """A StateView of the elevators and floors if the controller wants one (see StateView), otherwise None."""
+    return StateView(elevators, floors) if getattr(controller, 'STATE_VIEW', False) else None
+
+
+def update_controller(controller, elapsed, elevators, floors, state):
+    """Call the controller's update(), with the state (from state_view_for()), brought up to date, if there is one.
+    Returns whatever update() does."""
+    if state is None:
+        return controller.update(elapsed, elevators, floors)
+    state.refresh(elapsed)
+    return controller.update(elapsed, elevators, floors, state=state)
+
+
+def _read_only(values):
+    view = memoryview(values)
+    # memoryview.toreadonly() is new in Python 3.8.
+    return view.toreadonly() if hasattr(view, 'toreadonly') else view
@@ -0,0 +1,62 @@
+import unittest
+
+from building import Building
+from elevator import Elevator, SpeedProfile
+
+
+def play(building, seconds, start=0):
+    for elapsed in range(start, start + seconds):
+        building.update_all(elapsed)
+        building.notify_all(elapsed)
+
+
+class BecameIdleTest(unittest.TestCase):
+
+    def test_fires_again_after_a_command_that_goes_nowhere(self):
+        building = Building(1, 3, message_width=0)
+        elevator = building.elevators[0]
+        heard = []
+
+        def became_idle(e):
+            heard.append(e.floor_num)
+            if len(heard) == 1:
+                # Already on the ground floor, so the elevator's idle again as soon as it's updated.
+                e.go_down()
+
+        elevator.on('became_idle', became_idle)
+        play(building, 3)
+        self.assertEqual(heard, [0, 0])
+
+    def test_fires_once_while_idle(self):
+        building = Building(1, 3, message_width=0)
+        heard = []
+        building.elevators[0].on('became_idle', lambda e: heard.append(e.floor_num))
+        play(building, 5)
+        self.assertEqual(heard, [0])
+
+
+class RestartBetweenFloorsTest(unittest.TestCase):
+
+    def test_gets_to_the_next_floor(self):
+        building = Building(1, 8, message_width=0, speeds=[SpeedProfile(2, ramp=(3,))])
+        elevator = building.elevators[0]
+        elevator.go_up()
+        # Three seconds to the first floor, then two a floor: halfway between the third and fourth floors.
+        play(building, 8)
+        self.assertEqual(elevator.floor_num, 3.5)
+        elevator.open_doors_to_disembark()
+        play(building, 3, start=8)
+        self.assertEqual(elevator.status, Elevator.IDLE)
+
+        arrivals = []
+        elevator.on('arrive_at_floor', lambda e, floor: arrivals.append(floor.number))
+        elevator.go_up()
+        self.assertEqual(elevator.coasting_ticks(building), 1)
+        self.assertEqual(elevator.seconds_until_arrival(4), 2)
+        play(building, 2, start=11)
+        self.assertEqual(arrivals, [4])
+        self.assertEqual(elevator.position, 4 * Elevator.UNITS_PER_FLOOR)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import random
+import unittest
+
+from building import Building
+from elevator import Elevator, SpeedProfile
+from eta import EtaOracle
+
+
+class Drive:
+    """One elevator working through a plan of floors to stop at, the way EtaOracle assumes a controller does it:
+    doors open in the arrive_at_floor handler, and the elevator sets off again as soon as it's idle. If it's heading
+    away from the next floor in the plan, it stops at the next floor it gets to and turns around."""
+
+    def __init__(self, building, plan):
+        self.elevator = building.elevators[0]
+        self.plan = plan
+        self.elevator.on('idle', self.on_idle)
+        self.elevator.on('arrive_at_floor', self.on_arrive)
+
+    def on_idle(self, elevator):
+        if not self.plan:
+            return
+        if self.plan[0] == elevator.floor_num:
+            self.plan.pop(0)
+            elevator.open_doors_and_board_riders(True)
+        elif self.plan[0] > elevator.floor_num:
+            elevator.go_up()
+        else:
+            elevator.go_down()
+
+    def on_arrive(self, elevator, floor):
+        if self.plan and floor.number == self.plan[0]:
+            self.plan.pop(0)
+            elevator.open_doors_and_board_riders(True)
+        elif self.plan and ((elevator.status == Elevator.GOING_UP and self.plan[0] < floor.number) or
+                            (elevator.status == Elevator.GOING_DOWN and self.plan[0] > floor.number)):
+            elevator.open_doors_and_board_riders(True)
+
+
+def random_plan(rng, floor_count):
+    plan = []
+    for _ in range(rng.randint(1, 4)):
+        floor_num = rng.randrange(floor_count)
+        if not plan or plan[-1] != floor_num:
+            plan.append(floor_num)
+    return plan
+
+
+class EtaMatchesSimulationTest(unittest.TestCase):
+
+    def test_random_drives(self):
+        """Every second, predict when the elevator will get to the last floor in its plan, after stopping at the
+        others, and check that against when it does. Partway through, the plan gets a new first stop, and sometimes
+        the elevator gets stopped between floors; predictions from before then aren't expected to hold."""
+        rng = random.Random(1)
+        floor_count = 8
+        for trial in range(500):
+            speed = SpeedProfile(rng.randint(1, 6), ramp=[rng.randint(1, 8) for _ in range(rng.randint(0, 3))])
+            building = Building(1, floor_count, message_width=0, message_limit=0, speeds=[speed])
+            drive = Drive(building, random_plan(rng, floor_count))
+            oracle = EtaOracle(floor_count)
+            change_at = rng.randrange(1, 30)
+            halt = rng.random() < 0.5
+            predictions = []
+            arrived = None
+            for t in range(400):
+                building.update_all(t)
+                building.notify_all(t)
+                elevator = drive.elevator
+                if t == change_at:
+                    drive.plan.insert(0, rng.randrange(floor_count))
+                    if len(drive.plan) > 1 and drive.plan[0] == drive.plan[1]:
+                        drive.plan.pop(0)
+                if halt and t >= change_at and elevator.position % Elevator.UNITS_PER_FLOOR != 0:
+                    elevator.open_doors_to_disembark()
+                    halt = False
+                    change_at = t
+                if not drive.plan:
+                    arrived = t
+                    break
+                predictions.append((t, oracle.eta(elevator, drive.plan[-1], drive.plan[:-1])))
+            with self.subTest(trial=trial, speed=speed):
+                self.assertIsNotNone(arrived)
+                self.assertEqual([t + eta for (t, eta) in predictions if t >= change_at],
+                                 [arrived for (t, _) in predictions if t >= change_at])
+
+    def test_between_floors_going_either_way(self):
+        for target, expected in ((6, 2 + 2 * 2), (1, 2 + 2 * 2)):
+            with self.subTest(target=target):
+                building = Building(1, 8, message_width=0, message_limit=0, speeds=[SpeedProfile(2, ramp=(4,))])
+                elevator = building.elevators[0]
+                elevator.go_up()
+                for t in range(4 + 2 * 2 + 1):
+                    building.update_all(t)
+                    building.notify_all(t)
+                # Three and a half floors up, and stopped there.
+                elevator.open_doors_to_disembark()
+                self.assertEqual(elevator.floor_num, 3.5)
+                self.assertEqual(EtaOracle(8).eta(elevator, target), Elevator.DOOR_CYCLE_SECONDS + expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
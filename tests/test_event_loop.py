@@ -0,0 +1,119 @@
+import random
+import unittest
+
+from building import Building
+from dumb_controller import DumbElevatorController
+from game import import_scenarios, simulate_headless
+
+
+class CallsController:
+    """Keeps a list of floors with riders waiting, and each elevator's list of floors that riders on board have
+    asked for. The controllers below differ only in when they send the elevators on their way."""
+
+    def __init__(self, elevators, floors):
+        self.calls = []
+        self.elevators = elevators
+        self.floors = floors
+        for f in floors:
+            f.on('rider_request', self.on_request)
+        for e in elevators:
+            e['targets'] = []
+            e.on('arrive_at_floor', self.on_arrive)
+            e.on('floor_button_pressed', self.on_button)
+
+    def on_request(self, floor, going_up):
+        self.calls.append(floor.number)
+
+    def on_button(self, elevator, floor_num):
+        elevator['targets'].append(floor_num)
+
+    def on_arrive(self, elevator, floor):
+        if floor.number in elevator['targets'] or floor.number in self.calls:
+            elevator['targets'] = [t for t in elevator['targets'] if t != floor.number]
+            if floor.number in self.calls:
+                self.calls.remove(floor.number)
+            self.open_doors(elevator, floor)
+
+    def open_doors(self, elevator, floor):
+        if elevator['targets']:
+            elevator.open_doors_and_board_riders(elevator['targets'][0] > floor.number)
+        else:
+            waiting = floor.riders_waiting
+            elevator.open_doors_and_board_riders(bool(waiting) and waiting[0].destination_floor_num > floor.number)
+
+    def send(self, elevator):
+        """Send an idle elevator to its next target, or the oldest call."""
+        goal = elevator['targets'][0] if elevator['targets'] else (self.calls[0] if self.calls else None)
+        if goal is None:
+            return
+        if goal == elevator.floor_num:
+            elevator['targets'].remove(goal) if goal in elevator['targets'] else self.calls.remove(goal)
+            self.open_doors(elevator, self.floors[goal])
+        elif goal > elevator.floor_num:
+            elevator.go_up()
+        else:
+            elevator.go_down()
+
+
+class NextUpdateController(CallsController):
+    """Only wants its update() called when an elevator is sitting idle with somewhere to go."""
+
+    def next_update(self, elapsed):
+        work = any(e.status == e.IDLE and (e['targets'] or self.calls) for e in self.elevators)
+        return elapsed if work else None
+
+    def update(self, elapsed, elevators, floors):
+        for e in elevators:
+            if e.status == e.IDLE:
+                self.send(e)
+
+
+class BecameIdleController(CallsController):
+    """Does all its work in became_idle, and in rider_request for elevators that are already idle."""
+
+    def __init__(self, elevators, floors):
+        super().__init__(elevators, floors)
+        for e in elevators:
+            e.on('became_idle', self.send)
+
+    def on_request(self, floor, going_up):
+        super().on_request(floor, going_up)
+        for e in self.elevators:
+            if e.status == e.IDLE:
+                self.send(e)
+                break
+
+    def next_update(self, elapsed):
+        return None
+
+    def update(self, elapsed, elevators, floors):
+        pass
+
+
+class EventLoopMatchesGameLoopTest(unittest.TestCase):
+
+    def test_scores_match(self):
+        for controller_class in (DumbElevatorController, NextUpdateController, BecameIdleController):
+            for name, scenario_class in sorted(import_scenarios().items()):
+                for elevator_count, floor_count in ((1, 2), (1, 5), (3, 9)):
+                    for seed in range(3):
+                        with self.subTest(controller=controller_class.__name__, scenario=name,
+                                          elevators=elevator_count, floors=floor_count, seed=seed):
+                            scores = [self.play(controller_class, scenario_class, elevator_count, floor_count, seed,
+                                                event_driven) for event_driven in (False, True)]
+                            self.assertEqual(scores[0], scores[1])
+
+    def play(self, controller_class, scenario_class, elevator_count, floor_count, seed, event_driven):
+        random.seed(seed)
+        building = Building(elevator_count, floor_count, message_width=0, message_limit=0)
+        controller = controller_class(building.elevators, building.floors)
+        try:
+            scenario = scenario_class(building)
+        except ValueError:
+            # Too short a building for the scenario.
+            return None
+        return simulate_headless(scenario, building, controller, event_driven=event_driven)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import copy
+import unittest
+
+from benchmark import SteadyLoad
+from building import Building
+from dumb_controller import DumbElevatorController
+from elevator import Elevator
+from game import game_loop
+from lookahead import advance, what_if
+
+
+class Sweep:
+    """Runs every elevator from the bottom to the top and back, stopping at every floor on the way."""
+
+    def __init__(self, elevators, floors):
+        self.top = len(floors) - 1
+
+    def update(self, elapsed, elevators, floors):
+        for e in elevators:
+            going_up = e['up'] if 'up' in e else True
+            if e.status == Elevator.IDLE:
+                if e.floor_num == self.top:
+                    going_up = False
+                elif e.floor_num == 0:
+                    going_up = True
+                e['up'] = going_up
+                e.go_up() if going_up else e.go_down()
+            elif e.status in (Elevator.GOING_UP, Elevator.GOING_DOWN) and isinstance(e.floor_num, int):
+                e.open_doors_and_board_riders(going_up)
+
+
+def snapshot(building, elapsed):
+    return ([(e.position, e.status, e.rider_count, dict(e._contoller_data)) for e in building.elevators],
+            [(len(f.riders_waiting_up), len(f.riders_waiting_down)) for f in building.floors],
+            [(r.number, r.in_elevator, r.trip_start, r.trip_end) for r in building._active_riders.values()],
+            building.score(elapsed))
+
+
+class ForkTest(unittest.TestCase):
+
+    def played(self, seed, seconds=300):
+        building = Building(4, 12, message_width=0, message_limit=0)
+        game_loop(SteadyLoad(building, 30, seconds, seed=seed), building, Sweep(building.elevators, building.floors),
+                  force_duration=seconds)
+        return building, seconds + 1
+
+    def test_leaves_the_original_alone(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                building, elapsed = self.played(seed)
+                before = snapshot(building, elapsed)
+                fork = building.fork()
+                advance(fork, elapsed, 200, Sweep(fork.elevators, fork.floors))
+                self.assertEqual(snapshot(building, elapsed), before)
+
+    def test_plays_out_like_a_deep_copy(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                building, elapsed = self.played(seed)
+                fork = building.fork()
+                twin = copy.deepcopy(building)
+                end = advance(fork, elapsed, 200, Sweep(fork.elevators, fork.floors))
+                advance(twin, elapsed, 200, Sweep(twin.elevators, twin.floors))
+                self.assertEqual(fork.score(end), twin.score(end))
+                self.assertEqual(snapshot(fork, end), snapshot(twin, end))
+
+
+class WhatIfTest(unittest.TestCase):
+
+    def test_controller_that_boards_between_floors_is_refused(self):
+        building = Building(1, 5, message_width=0, message_limit=0)
+        building.elevators[0].go_up()
+        advance(building, 0, 2)
+        with self.assertRaises(ValueError):
+            what_if(building, 2, 10, make_controller=lambda fork: DumbElevatorController(fork.elevators, fork.floors))
+
+    def test_controller_made_for_the_fork(self):
+        building = Building(1, 5, message_width=0, message_limit=0)
+        building.new_rider(0, 3, 0).started_waiting = 0
+        delta = what_if(building, 0, 60,
+                        make_controller=lambda fork: DumbElevatorController(fork.elevators, fork.floors))
+        self.assertEqual(delta['finished_rides'], 1)
+        self.assertEqual(building.score(0)['finished_rides'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import random
+import unittest
+
+from building import Building
+from dumb_controller import DumbElevatorController
+from game import simulate_headless
+from metrics import MetricsCollector, QuantileSketch, RunMetrics
+from scenarios import InterfloorTraffic
+
+QUANTILES = (0, 0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1)
+
+
+def streams():
+    rng = random.Random(3)
+    yield 'waits', [rng.randrange(600) for _ in range(5000)]
+    yield 'lognormal', [rng.lognormvariate(3, 1.5) for _ in range(5000)]
+    yield 'exponential', [rng.expovariate(0.01) for _ in range(5000)]
+    yield 'one value', [42] * 10
+
+
+def sketch_of(values, relative_accuracy=0.01):
+    sketch = QuantileSketch(relative_accuracy)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def test_quantiles_are_within_the_accuracy(self):
+        for relative_accuracy in (0.01, 0.05):
+            for name, values in streams():
+                sketch = sketch_of(values, relative_accuracy)
+                ordered = sorted(values)
+                for q in QUANTILES:
+                    with self.subTest(accuracy=relative_accuracy, stream=name, q=q):
+                        actual = ordered[int(q * (len(values) - 1))]
+                        self.assertLessEqual(abs(sketch.quantile(q) - actual), relative_accuracy * actual + 1e-9)
+
+    def test_merging_is_the_same_as_adding_everything_to_one(self):
+        rng = random.Random(4)
+        for name, values in streams():
+            with self.subTest(stream=name):
+                parts = [QuantileSketch(), QuantileSketch(), QuantileSketch()]
+                for value in values:
+                    rng.choice(parts).add(value)
+                merged = parts[0]
+                merged.merge(parts[1])
+                merged.merge(parts[2])
+                self.assertEqual(merged.to_dict(), sketch_of(values).to_dict())
+
+    def test_merging_different_accuracies_is_refused(self):
+        with self.assertRaises(ValueError):
+            sketch_of([1, 2, 3], 0.01).merge(sketch_of([4], 0.02))
+
+    def test_survives_json(self):
+        _, values = next(streams())
+        sketch = sketch_of(values)
+        copy = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+        self.assertEqual([copy.quantile(q) for q in QUANTILES], [sketch.quantile(q) for q in QUANTILES])
+
+    def test_empty(self):
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+
+class RunMetricsTest(unittest.TestCase):
+
+    def collect(self, seed):
+        random.seed(seed)
+        building = Building(2, 6, message_width=0, message_limit=0)
+        controller = DumbElevatorController(building.elevators, building.floors)
+        collector = MetricsCollector(building)
+        score = simulate_headless(InterfloorTraffic(building, duration=600), building, controller,
+                                  after_tick=collector.sample)
+        return score, collector.finish()
+
+    def test_every_rider_counts_toward_waits(self):
+        score, metrics = self.collect(1)
+        self.assertEqual(metrics.wait.count, score['finished_rides'] + score['unfinished_rides'])
+        self.assertEqual(metrics.trip.count, score['finished_rides'])
+        self.assertEqual(sum(metrics.seconds), sum(sum(counts) for counts in metrics.status_seconds[0]))
+
+    def test_merged_runs_add_up(self):
+        runs = [self.collect(seed)[1] for seed in range(3)]
+        merged = RunMetrics.from_dict(json.loads(json.dumps(runs[0].to_dict())))
+        for metrics in runs[1:]:
+            merged.merge(RunMetrics.from_dict(json.loads(json.dumps(metrics.to_dict()))))
+        self.assertEqual(merged.runs, 3)
+        self.assertEqual(merged.wait.count, sum(m.wait.count for m in runs))
+        for bucket, seconds in enumerate(merged.seconds):
+            self.assertEqual(seconds, sum(m.seconds[bucket] for m in runs if bucket < len(m.seconds)))
+        for floor_num, peaks in enumerate(merged.queue_peak):
+            self.assertEqual(max(peaks), max(max(m.queue_peak[floor_num]) for m in runs))
+        wait = QuantileSketch()
+        for metrics in runs:
+            wait.merge(metrics.wait)
+        self.assertEqual(merged.wait.to_dict(), wait.to_dict())
+
+    def test_different_buildings_are_refused(self):
+        with self.assertRaises(ValueError):
+            RunMetrics(2, 6).merge(RunMetrics(3, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
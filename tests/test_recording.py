@@ -0,0 +1,111 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from building import Building
+from dumb_controller import DumbElevatorController
+from game import simulate_headless
+from recording import Recorder, Recording, RunState
+from scenarios import InterfloorTraffic
+
+
+def snapshot(building):
+    return ([[e.position, e.status, e.rider_count] for e in building.elevators],
+            [[len(f.riders_waiting_up), len(f.riders_waiting_down)] for f in building.floors])
+
+
+class ChattyController(DumbElevatorController):
+
+    def update(self, elapsed, elevators, floors):
+        return f'second {elapsed}' if elapsed % 7 == 0 else None
+
+
+def played(recording):
+    """What the recording says the building looked like at the end of every second. (play() updates one RunState
+    as it goes, so each second's state gets copied.)"""
+    return {state.elapsed: (state.elevators, state.floors) for state in map(RunState.copy, recording.play())}
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'run.eyr')
+
+    def record(self, seconds=900):
+        """Play some traffic while recording it, and return what the building looked like at the end of every
+        second, along with its messages."""
+        random.seed(5)
+        building = Building(3, 9, message_width=40, name='InterfloorTraffic', message_limit=None)
+        controller = ChattyController(building.elevators, building.floors)
+        scenario = InterfloorTraffic(building, duration=seconds)
+        live = {}
+        messages = []
+        building.add_message_listener(messages.append)
+        with Recorder(self.path, building, keyframe_interval=37) as recorder:
+            def after_tick(elapsed):
+                recorder.record(elapsed)
+                live[elapsed] = snapshot(building)
+            simulate_headless(scenario, building, controller, after_tick=after_tick)
+        return live, messages
+
+    def test_play_and_seek(self):
+        live, messages = self.record()
+        with Recording(self.path) as recording:
+            self.assertEqual(recording.name, 'InterfloorTraffic')
+            self.assertEqual(recording.last_elapsed, max(live))
+            self.assertEqual(played(recording), live)
+            rng = random.Random(1)
+            for elapsed in [rng.randrange(max(live) + 1) for _ in range(100)]:
+                state = recording.state_at(elapsed)
+                self.assertEqual((state.elapsed, state.elevators, state.floors), (elapsed, *live[elapsed]))
+            self.assertIsNone(recording.state_at(max(live) + 1))
+
+    def test_messages_and_rider_events(self):
+        live, messages = self.record(seconds=300)
+        with Recording(self.path) as recording:
+            replayed = []
+            boarded = 0
+            for state in recording.play():
+                if state.new_message_count:
+                    replayed.extend(list(state.messages)[-state.new_message_count:])
+                boarded += sum(1 for event in state.rider_events if event[0] == 'boarded')
+        self.assertEqual([(elapsed, text) for (elapsed, _, text) in replayed],
+                         [(elapsed, str(text)) for (elapsed, _, text) in messages])
+        self.assertGreater(len(messages), 0)
+        self.assertGreater(boarded, 0)
+
+    def test_crashed_run_is_still_playable(self):
+        live, _ = self.record()
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 3000)
+        with Recording(self.path) as recording:
+            partial = played(recording)
+        self.assertGreater(len(partial), len(live) / 2)
+        self.assertLess(len(partial), len(live))
+        self.assertEqual(partial, {elapsed: live[elapsed] for elapsed in partial})
+
+    def test_counts_past_65535(self):
+        building = Building(1, 3, message_width=0)
+        with Recorder(self.path, building, keyframe_interval=2) as recorder:
+            for elapsed in range(3):
+                for _ in range(40000):
+                    building.new_rider(0, 2, elapsed).started_waiting = elapsed
+                if elapsed == 1:
+                    for n in range(70000):
+                        building.add_message('Tst', elapsed, f'message {n}')
+                building.update_all(elapsed)
+                building.notify_all(elapsed)
+                recorder.record(elapsed)
+        with Recording(self.path) as recording:
+            states = [state.copy() for state in recording.play()]
+        self.assertEqual([state.floors[0] for state in states], [[40000, 0], [80000, 0], [120000, 0]])
+        self.assertEqual([len(state.rider_events) for state in states], [40000] * 3)
+        self.assertEqual(states[1].new_message_count, 70000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import random
+import unittest
+
+from building import Building
+from dumb_controller import DumbElevatorController
+from errors import ControllerCrashed
+from game import simulate_headless
+from remote import RemoteController
+from scenarios import OneGuyGoesUp, TenRandomRides
+import test_event_loop
+
+
+class ButtonsController(test_event_loop.NextUpdateController):
+    """Boards riders going whichever way the last rider on the floor asked to go. A remote controller hears about
+    events a second late, and if it looked at who's waiting then, it could see riders who'd shown up since, so
+    this is the kind of handler-driven controller that plays the same either way."""
+
+    def __init__(self, elevators, floors):
+        super().__init__(elevators, floors)
+        self.asked_up = {}
+
+    def on_request(self, floor, going_up):
+        super().on_request(floor, going_up)
+        self.asked_up[floor.number] = going_up
+
+    def open_doors(self, elevator, floor):
+        if elevator['targets']:
+            elevator.open_doors_and_board_riders(elevator['targets'][0] > floor.number)
+        else:
+            elevator.open_doors_and_board_riders(self.asked_up.get(floor.number, False))
+
+
+class CrashingController(DumbElevatorController):
+
+    def update(self, elapsed, elevators, floors):
+        if elapsed == 5:
+            raise RuntimeError('oops')
+        return super().update(elapsed, elevators, floors)
+
+
+class RemoteMatchesInProcessTest(unittest.TestCase):
+
+    def test_scores_match(self):
+        for controller_class in (DumbElevatorController, ButtonsController):
+            for scenario_class in (OneGuyGoesUp, TenRandomRides):
+                for elevator_count, floor_count in ((1, 2), (3, 9)):
+                    for seed in range(5):
+                        for event_driven in (False, True):
+                            with self.subTest(controller=controller_class.__name__,
+                                              scenario=scenario_class.__name__, elevators=elevator_count,
+                                              floors=floor_count, seed=seed, event_driven=event_driven):
+                                self.assertEqual(
+                                    self.play(controller_class, scenario_class, elevator_count, floor_count, seed,
+                                              event_driven, remote=True),
+                                    self.play(controller_class, scenario_class, elevator_count, floor_count, seed,
+                                              event_driven, remote=False))
+
+    def test_crash_is_reported(self):
+        building = Building(1, 5, message_width=0)
+        with RemoteController(CrashingController, building) as controller:
+            with self.assertRaises(ControllerCrashed):
+                simulate_headless(TenRandomRides(building), building, controller)
+
+    def play(self, controller_class, scenario_class, elevator_count, floor_count, seed, event_driven, remote):
+        random.seed(seed)
+        building = Building(elevator_count, floor_count, message_width=0, message_limit=0)
+        if not remote:
+            controller = controller_class(building.elevators, building.floors)
+            return simulate_headless(scenario_class(building), building, controller, event_driven=event_driven)
+        with RemoteController(controller_class, building) as controller:
+            return simulate_headless(scenario_class(building), building, controller, event_driven=event_driven)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import random
+import unittest
+
+from building import Building
+from dumb_controller import DumbElevatorController
+import vectorized
+
+np = vectorized.np
+
+
+class Rides:
+    """The same rides for both engines: (elapsed, building_num, start_floor_num, destination_floor_num) tuples."""
+
+    def __init__(self, rides):
+        self._rides = rides
+
+    def for_building(self, building_num):
+        return [(t, start, destination) for (t, b, start, destination) in self._rides if b == building_num]
+
+    def update(self, elapsed, batch):
+        arriving = [ride[1:] for ride in self._rides if ride[0] == elapsed]
+        if arriving:
+            batch.add_riders(*(np.array(column) for column in zip(*arriving)))
+
+
+def random_rides(building_count, floor_count, duration, count, seed):
+    rng = random.Random(seed)
+    rides = []
+    for _ in range(count):
+        start, destination = rng.sample(range(floor_count), 2)
+        rides.append((rng.randrange(duration), rng.randrange(building_count), start, destination))
+    return Rides(sorted(rides))
+
+
+def scalar_score(rides, elevator_count, floor_count, duration):
+    """Play the rides in an ordinary building, the way game.game_loop() does, and score it."""
+    building = Building(elevator_count, floor_count, message_width=0, message_limit=0)
+    controller = DumbElevatorController(building.elevators, building.floors)
+    for elapsed in range(duration):
+        for t, start, destination in rides:
+            if t == elapsed:
+                building.new_rider(start, destination, elapsed).started_waiting = elapsed
+        controller.update(elapsed, building.elevators, building.floors)
+        building.update_all(elapsed)
+        building.notify_all(elapsed)
+    return building.score(duration)
+
+
+@unittest.skipIf(np is None, 'needs NumPy')
+class BatchMatchesScalarTest(unittest.TestCase):
+
+    def test_dumb_controller_scores_match(self):
+        for elevator_count, floor_count in ((1, 2), (1, 6), (3, 9)):
+            building_count, duration = 50, 400
+            rides = random_rides(building_count, floor_count, duration, 600, seed=floor_count)
+            batch = vectorized.BuildingBatch(building_count, elevator_count, floor_count)
+            scores = vectorized.simulate_batch(batch, rides, vectorized.BatchDumbController(batch), duration)
+            for b in range(building_count):
+                expected = scalar_score(rides.for_building(b), elevator_count, floor_count, duration)
+                with self.subTest(elevators=elevator_count, floors=floor_count, building=b):
+                    self.assertEqual(scores['finished_rides'][b], expected['finished_rides'])
+                    self.assertEqual(scores['unfinished_rides'][b], expected['unfinished_rides'])
+                    self.assertAlmostEqual(scores['average_wait'][b], expected['average_wait'])
+
+
+if __name__ == '__main__':
+    unittest.main()
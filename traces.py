@@ -0,0 +1,111 @@
+#!/usr/local/bin/python
+import argparse
+import csv
+import mmap
+import os
+import struct
+
+from elevator import Elevator
+from scenarios import Scenario
+
+TRACE_MAGIC = b'EYTRACE1'
+TRACE_RECORD = struct.Struct('<IHH')   # seconds elapsed, start floor number, destination floor number
+
+
+class TraceWriter:
+    """Writes rider arrivals to a trace file, eight bytes apiece. Use it as a context manager, or close() it."""
+
+    def __init__(self, path):
+        self._file = open(path, 'wb', buffering=1024 * 1024)
+        self._file.write(TRACE_MAGIC)
+        self._last_elapsed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def record_rider(self, rider, elapsed):
+        """Building rider listener (see Building.add_rider_listener) that records every new rider."""
+        self.write(elapsed, rider.start_floor_num, rider.destination_floor_num)
+
+    def write(self, elapsed, start_floor_num, destination_floor_num):
+        if elapsed < self._last_elapsed:
+            raise ValueError(f'trace records have to be in time order ({elapsed} came after {self._last_elapsed})')
+        self._last_elapsed = elapsed
+        self._file.write(TRACE_RECORD.pack(elapsed, start_floor_num, destination_floor_num))
+
+
+def last_trace_time(path):
+    """When does the last rider in a trace file show up? (None if nobody does.)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < len(TRACE_MAGIC) + TRACE_RECORD.size:
+            return None
+        f.seek(-TRACE_RECORD.size, os.SEEK_END)
+        return TRACE_RECORD.unpack(f.read(TRACE_RECORD.size))[0]
+
+
+def read_trace(path):
+    """Generate (elapsed, start floor number, destination floor number) records from a trace file, reading them
+    straight out of a memory map as they're asked for, so even enormous traces never have to fit in memory."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < len(TRACE_MAGIC):
+            raise ValueError(f'{path} is not a rider trace file')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+                raise ValueError(f'{path} is not a rider trace file')
+            for offset in range(len(TRACE_MAGIC), len(mm) - TRACE_RECORD.size + 1, TRACE_RECORD.size):
+                yield TRACE_RECORD.unpack_from(mm, offset)
+
+
+class ReplayTrace(Scenario):
+    """Replays the riders recorded in a trace file, each one showing up at the same second it did originally. The
+    scenario is finished when the trace runs out and everybody in it has gotten where they were going."""
+
+    def __init__(self, building, path):
+        super().__init__()
+        self._records = read_trace(path)
+        self._next_record = next(self._records, None)
+        self._riders_finished = 0
+        self._riders_started = 0
+        last_elapsed = last_trace_time(path) or 0
+        self.max_duration = last_elapsed + 10 * Elevator.calculate_optimal_trip(0, len(building.floors) - 1)
+        if self._next_record is None:
+            self.finished()
+
+    def handle_ride_finished(self, _):
+        self._riders_finished += 1
+        if self._next_record is None and self._riders_finished == self._riders_started:
+            self.finished()
+
+    def next_update(self, elapsed):
+        return None if self._next_record is None else max(elapsed, self._next_record[0])
+
+    def update(self, elapsed, building):
+        while self._next_record is not None and self._next_record[0] <= elapsed:
+            _, start, end = self._next_record
+            self._next_record = next(self._records, None)
+            rider = building.new_rider(start, end, elapsed)
+            rider.started_waiting = elapsed
+            rider.on('reached_destination', self.handle_ride_finished)
+            self._riders_started += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert rider traces to and from CSV (elapsed,start,destination)')
+    parser.add_argument('command', choices=('from-csv', 'to-csv'))
+    parser.add_argument('source', type=str)
+    parser.add_argument('destination', type=str)
+    args = parser.parse_args()
+
+    if args.command == 'from-csv':
+        with open(args.source, 'rt', newline='') as f, TraceWriter(args.destination) as writer:
+            for row in csv.reader(f):
+                writer.write(*(int(n) for n in row))
+    else:
+        with open(args.destination, 'wt', newline='') as f:
+            csv.writer(f).writerows(read_trace(args.source))
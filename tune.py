@@ -0,0 +1,186 @@
+#!/usr/local/bin/python
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import math
+import os
+import random
+import statistics
+
+from building import Building
+from cache import ResultCache, cache_key
+from game import (default_scenarios, import_scenarios, load_controller_class, scenario_pairs_in_source_order,
+                  simulate_headless)
+
+# A controller makes itself tunable with a PARAMETERS class attribute: a dict of parameter names and their default
+# values, which it also has as class attributes of the same names, and reads as self.<name>. The tuner tries other
+# values by subclassing the controller with different class attributes, so its __init__ doesn't have to change.
+
+TuneCell = collections.namedtuple('TuneCell', ('controller', 'parameters', 'scenario', 'seed', 'elevators', 'floors',
+                                               'fraction'))
+
+
+def cost(score):
+    """What the tuner tries to make as small as possible: seconds from showing up to getting there, for the average
+    rider. Riders who haven't got where they're going yet count with the time they've waited so far."""
+    return score['average_wait'] + score['average_trip']
+
+
+def tuned_class(controller_class, parameters):
+    """A subclass of the controller class with the given parameter values (a dict, or (name, value) pairs) in
+    place of its defaults."""
+    parameters = dict(parameters)
+    unknown = set(parameters) - set(getattr(controller_class, 'PARAMETERS', {}))
+    if unknown:
+        raise ValueError(f'{controller_class.__name__} has no parameter called {", ".join(sorted(unknown))}; '
+                         f'tunable parameters go in its PARAMETERS dict')
+    return type(controller_class.__name__, (controller_class,), parameters)
+
+
+def run_cell(cell):
+    """Simulate one cell: a candidate's run through a scenario, cut short to the given fraction of the scenario's
+    maximum duration."""
+    random.seed(cell.seed)
+    controller_class = tuned_class(load_controller_class(cell.controller), cell.parameters)
+    building = Building(elevator_count=cell.elevators, floor_count=cell.floors, message_width=0, name=cell.scenario,
+                        message_limit=0)
+    controller = controller_class(building.elevators, building.floors)
+    scenario = import_scenarios()[cell.scenario](building)
+    duration = None if cell.fraction >= 1 else max(1, round(scenario.max_duration * cell.fraction))
+    return cell, simulate_headless(scenario, building, controller, force_duration=duration)
+
+
+def cell_key(cell, scenario_class):
+    return cache_key(f'{cell.controller}_controller', scenario_class, seed=cell.seed, elevators=cell.elevators,
+                     floors=cell.floors, fraction=cell.fraction, parameters=dict(cell.parameters))
+
+
+def rung_fractions(candidate_count, eta):
+    """How much of each scenario the candidates get to play in each round: every round keeps the best 1/eta of
+    the candidates and gives them eta times as long, and the last round (with eta or fewer left) plays in full."""
+    rounds = 1
+    while candidate_count > eta:
+        candidate_count = math.ceil(candidate_count / eta)
+        rounds += 1
+    return [eta ** (r - rounds + 1) for r in range(rounds)]
+
+
+def successive_halving(controller, candidates, scenarios, seeds, elevators, floors, eta=3, jobs=None, cache=None,
+                       rerun=False, report=None):
+    """Find the best of the candidates (dicts of parameter values) for the controller (a file name prefix, as for
+    run.py) by successive halving: play every candidate through short versions of the scenarios, with every seed,
+    drop all but the best 1/eta of them, and repeat with eta times longer versions until the survivors have played
+    the scenarios in full. Simulations run in parallel, jobs at a time (one per core by default), and their scores
+    come from (and go into) the cache, if given. After each round, report(fraction, ranking) gets called, if given.
+    Returns the last round's ranking: (cost, candidate) pairs, best first."""
+    scenario_classes = import_scenarios()
+    survivors = [tuple(sorted(c.items())) for c in candidates]
+    fractions = rung_fractions(len(survivors), eta)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        for n, fraction in enumerate(fractions):
+            cells = [TuneCell(controller, p, s, seed, elevators, floors, fraction) for (p, s, seed) in
+                     itertools.product(survivors, scenarios, seeds)]
+            scores = {}
+            if cache is not None:
+                keys = {cell: cell_key(cell, scenario_classes[cell.scenario]) for cell in cells}
+                for cell in ([] if rerun else cells):
+                    score = cache.get(keys[cell])
+                    if score is not None:
+                        scores[cell] = score
+            misses = [cell for cell in cells if cell not in scores]
+            chunksize = max(1, len(misses) // (4 * (jobs or os.cpu_count() or 1)))
+            for cell, score in pool.map(run_cell, misses, chunksize=chunksize):
+                scores[cell] = score
+                if cache is not None:
+                    cache.put(keys[cell], score)
+
+            costs = collections.defaultdict(list)
+            for cell in cells:
+                costs[cell.parameters].append(cost(scores[cell]))
+            ranking = sorted(((round(statistics.mean(c), 2), p) for (p, c) in costs.items()),
+                             key=lambda pair: pair[0])
+            ranking = [(c, dict(p)) for (c, p) in ranking]
+            if report is not None:
+                report(fraction, ranking)
+            if n < len(fractions) - 1:
+                survivors = [tuple(sorted(p.items())) for (_, p) in ranking[:math.ceil(len(ranking) / eta)]]
+    return ranking
+
+
+def parse_values(controller_class, specs):
+    """Turn "name=value,value,..." strings into a dict of the values to try for each parameter, converted to the
+    type of the parameter's default."""
+    defaults = getattr(controller_class, 'PARAMETERS', {})
+    space = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if name not in defaults:
+            raise ValueError(f'{controller_class.__name__} has no parameter called {name}; '
+                             f'it has {", ".join(defaults) or "none"}')
+        kind = type(defaults[name])
+        if kind is bool:
+            space[name] = [v.lower() in ('1', 'true', 'yes') for v in values.split(',')]
+        else:
+            space[name] = [kind(v) for v in values.split(',')]
+    return space
+
+
+def make_candidates(space, count=None, seed=None):
+    """Every combination of the values in the search space, or, if count is given and there are more than that,
+    count of them picked at random."""
+    names = sorted(space)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*(space[nm] for nm in names))]
+    if count is not None and count < len(candidates):
+        candidates = random.Random(seed).sample(candidates, count)
+    return candidates
+
+
+def print_ranking(fraction, ranking, limit=None):
+    print(f'{len(ranking)} candidates, playing {"all" if fraction >= 1 else f"1/{round(1 / fraction)}"} '
+          f'of each scenario:')
+    for c, p in ranking[:limit]:
+        print(f'  {c:10.2f}  {" ".join(f"{nm}={v}" for (nm, v) in p.items()) or "(defaults)"}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Find the best values for a controller's parameters")
+    parser.add_argument('controller', type=str, help='controller file name prefix, as for run.py')
+    parser.add_argument('--candidates', type=int,
+                        help='try this many combinations of values, picked at random (default: all of them)')
+    parser.add_argument('--elevators', type=int, default=3, help='number of elevators')
+    parser.add_argument('--eta', type=int, default=3,
+                        help='keep the best 1/ETA of the candidates after each round (default: 3)')
+    parser.add_argument('--floors', type=int, default=5, help='number of floors')
+    parser.add_argument('--jobs', type=int, help='number of worker processes (default: one per core)')
+    parser.add_argument('--no-cache', action='store_true', help="don't look for cached scores or save new ones")
+    parser.add_argument('--only', type=str,
+                        help='comma-separated names of scenarios to run (default: all but the traffic scenarios)')
+    parser.add_argument('--param', type=str, action='append', default=[], metavar='NAME=VALUE,VALUE,...',
+                        help='values to try for a parameter (repeat for each parameter; the rest keep their '
+                             'defaults)')
+    parser.add_argument('--rerun', action='store_true', help='simulate every run, even those whose scores are cached')
+    parser.add_argument('--seed', type=int, help='seed for picking candidates at random')
+    parser.add_argument('--seeds', type=int, default=3, help='play each scenario with seeds 0 through N-1')
+
+    args = parser.parse_args()
+    if args.eta < 2:
+        parser.error('--eta has to be at least 2')
+    try:
+        space = parse_values(load_controller_class(args.controller), args.param)
+    except ValueError as e:
+        parser.error(str(e))
+    scenarios = import_scenarios()
+    if args.only:
+        scenarios = {nm: scenarios[nm] for nm in args.only.split(',')}
+    else:
+        scenarios = default_scenarios()
+    scenario_names = [nm for (nm, _) in scenario_pairs_in_source_order(scenarios)]
+
+    candidates = make_candidates(space, count=args.candidates, seed=args.seed)
+    best = successive_halving(args.controller, candidates, scenario_names, range(args.seeds), args.elevators,
+                              args.floors, eta=args.eta, jobs=args.jobs,
+                              cache=(None if args.no_cache else ResultCache()), rerun=args.rerun,
+                              report=lambda fraction, ranking: print_ranking(fraction, ranking, limit=10))
+    print()
+    print(f'Best: {" ".join(f"{nm}={v}" for (nm, v) in best[0][1].items()) or "(defaults)"}')
@@ -0,0 +1,195 @@
+try:
+    import numpy as np
+except ImportError:
+    # Nothing else in Elevator Yarn needs NumPy, so it's only required if you use this module.
+    np = None
+
+from elevator import Elevator
+from errors import DoorsAreOpen
+
+
+class BuildingBatch:
+    """Lots of identical buildings (each with the same number of elevators and floors), all simulated in lockstep.
+    Instead of Elevator and Floor objects, the state of every elevator in every building lives in NumPy arrays
+    indexed by [building_num, elevator_num], and riders are just counts: how many are waiting on each floor for each
+    destination, and how many are riding in each elevator to each destination.
+
+    Elevators move (at the standard speed), open and close their doors, and let riders on and off exactly the way
+    Elevator.update() does it, second for second, except that there are no events. A batch controller looks at the
+    arrays every second instead (see BatchDumbController) and hands back an array of commands, one per elevator in
+    every building."""
+
+    NO_COMMAND = 0
+    GO_UP = 1
+    GO_DOWN = 2
+    BOARD_GOING_UP = 3
+    BOARD_GOING_DOWN = 4
+    DISEMBARK = 5
+
+    def __init__(self, building_count, elevator_count, floor_count):
+        if np is None:
+            raise ImportError('simulating a batch of buildings requires NumPy (pip install numpy)')
+        shape = (building_count, elevator_count)
+        self.building_count = building_count
+        self.elevator_count = elevator_count
+        self.floor_count = floor_count
+        self._arrived = np.zeros(shape, dtype=bool)
+        self._boarding_up = np.zeros(shape, dtype=bool)
+        self._goes_up = np.arange(floor_count)[np.newaxis, :] > np.arange(floor_count)[:, np.newaxis]
+        self._riders_finished = np.zeros(building_count, dtype=np.int64)
+        self._riders_started = np.zeros(building_count, dtype=np.int64)
+        self._riding = np.zeros(shape + (floor_count,), dtype=np.int32)
+        self._status = np.full(shape, Elevator.IDLE, dtype=np.int8)
+        # Positions are kept in whole seconds of travel above the ground floor, so they're exact.
+        self._steps = np.zeros(shape, dtype=np.int64)
+        self._top_steps = (floor_count - 1) * Elevator.SECONDS_BETWEEN_FLOORS
+        self._total_wait = np.zeros(building_count, dtype=np.int64)
+        self._waiting = np.zeros((building_count, floor_count, floor_count), dtype=np.int32)
+
+    @property
+    def arrived(self):
+        """Which elevators reached a floor during the last second (the batch version of "arrive_at_floor")?"""
+        return self._arrived
+
+    @property
+    def floor_num(self):
+        return self._steps / Elevator.SECONDS_BETWEEN_FLOORS
+
+    @property
+    def idle(self):
+        return self._status == Elevator.IDLE
+
+    @property
+    def rider_count(self):
+        return self._riding.sum(axis=2)
+
+    @property
+    def riders_going_to(self):
+        """How many riders in each elevator want to get off at each floor, indexed by [building, elevator, floor]."""
+        return self._riding
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def waiting_down(self):
+        """How many riders on each floor want to go down, indexed by [building, floor]."""
+        return (self._waiting * ~self._goes_up).sum(axis=2)
+
+    @property
+    def waiting_up(self):
+        """How many riders on each floor want to go up, indexed by [building, floor]."""
+        return (self._waiting * self._goes_up).sum(axis=2)
+
+    def add_riders(self, building_nums, start_floor_nums, destination_floor_nums):
+        """New riders show up: one for each (building, start floor, destination floor) in the three arrays."""
+        if np.any(start_floor_nums == destination_floor_nums):
+            raise ValueError('scenario wanted rides from a floor to itself')
+        np.add.at(self._waiting, (building_nums, start_floor_nums, destination_floor_nums), 1)
+        self._riders_started += np.bincount(building_nums, minlength=self.building_count)
+
+    def command(self, commands):
+        """Carry out an array of commands (NO_COMMAND, GO_UP, etc.), indexed by [building, elevator]."""
+        moving = (commands == self.GO_UP) | (commands == self.GO_DOWN)
+        if np.any(moving & (self._status != Elevator.IDLE)):
+            raise DoorsAreOpen()
+        self._status[commands == self.GO_UP] = Elevator.GOING_UP
+        self._status[commands == self.GO_DOWN] = Elevator.GOING_DOWN
+        boarding = (commands == self.BOARD_GOING_UP) | (commands == self.BOARD_GOING_DOWN)
+        self._status[boarding] = Elevator.OPENING_DOORS_TO_BOARD
+        self._boarding_up[boarding] = commands[boarding] == self.BOARD_GOING_UP
+        self._status[commands == self.DISEMBARK] = Elevator.OPENING_DOORS_TO_DISGORGE
+
+    def score(self):
+        """Scores for every building, as arrays. Trip efficiency isn't tracked, because riders are only counted."""
+        return {
+            'finished_rides': self._riders_finished.copy(),
+            'unfinished_rides': self._riders_started - self._riders_finished,
+            'average_wait': self._total_wait / np.maximum(self._riders_started, 1),
+        }
+
+    def update(self, elapsed):
+        """One second passes in every building. Elevators within a building take their turns in order, just as in
+        Building.update_all(), because two of them boarding on the same floor can't both pick up the same riders."""
+        for m in range(self.elevator_count):
+            status = self._status[:, m]
+            steps = self._steps[:, m]
+            was = status.copy()
+            was_at = steps.copy()
+
+            going_up = was == Elevator.GOING_UP
+            steps[going_up & (was_at < self._top_steps)] += 1
+            status[going_up & (was_at >= self._top_steps)] = Elevator.IDLE
+            going_down = was == Elevator.GOING_DOWN
+            steps[going_down & (was_at > 0)] -= 1
+            status[going_down & (was_at <= 0)] = Elevator.IDLE
+
+            boarding = np.flatnonzero(was == Elevator.BOARDING_RIDERS)
+            if len(boarding) > 0:
+                self._take_in_riders(m, boarding)
+            self._disgorge_riders(m, np.concatenate((boarding, np.flatnonzero(was == Elevator.DISGORGING_RIDERS))))
+
+            status[was == Elevator.OPENING_DOORS_TO_BOARD] = Elevator.BOARDING_RIDERS
+            status[(was == Elevator.BOARDING_RIDERS) | (was == Elevator.DISGORGING_RIDERS)] = Elevator.CLOSING_DOORS
+            status[was == Elevator.CLOSING_DOORS] = Elevator.IDLE
+            status[was == Elevator.OPENING_DOORS_TO_DISGORGE] = Elevator.DISGORGING_RIDERS
+
+            self._arrived[:, m] = (steps != was_at) & (steps % Elevator.SECONDS_BETWEEN_FLOORS == 0)
+
+        # Every rider still waiting has now waited one more second.
+        self._total_wait += self._waiting.sum(axis=(1, 2))
+
+    def _disgorge_riders(self, m, building_nums):
+        if len(building_nums) == 0:
+            return
+        floor_nums = self._steps[building_nums, m] // Elevator.SECONDS_BETWEEN_FLOORS
+        self._riders_finished[building_nums] += self._riding[building_nums, m, floor_nums]
+        self._riding[building_nums, m, floor_nums] = 0
+
+    def _take_in_riders(self, m, building_nums):
+        floor_nums = self._steps[building_nums, m] // Elevator.SECONDS_BETWEEN_FLOORS
+        same_direction = self._goes_up[floor_nums] == self._boarding_up[building_nums, m][:, np.newaxis]
+        boarding = self._waiting[building_nums, floor_nums] * same_direction
+        self._waiting[building_nums, floor_nums] -= boarding
+        self._riding[building_nums, m] += boarding
+
+
+class BatchDumbController:
+    """DumbElevatorController (see dumb_controller.py), taught to drive every building in a batch at once: the first
+    elevator in each building visits every floor, over and over again."""
+
+    def __init__(self, batch):
+        self._going_up = np.ones(batch.building_count, dtype=bool)
+        self._started = False
+
+    def update(self, elapsed, batch):
+        commands = np.full((batch.building_count, batch.elevator_count), batch.NO_COMMAND, dtype=np.int8)
+        if not self._started:
+            self._started = True
+            commands[:, 0] = batch.BOARD_GOING_UP
+            return commands
+
+        floor_num = batch.floor_num[:, 0]
+        idle = batch.idle[:, 0]
+        self._going_up[idle & (floor_num == batch.floor_count - 1)] = False
+        self._going_up[idle & (floor_num == 0)] = True
+        commands[idle, 0] = np.where(self._going_up[idle], batch.GO_UP, batch.GO_DOWN)
+
+        arrived = batch.arrived[:, 0]
+        commands[arrived, 0] = np.where(self._going_up[arrived], batch.BOARD_GOING_UP, batch.BOARD_GOING_DOWN)
+        return commands
+
+
+def simulate_batch(batch, scenario, controller, duration):
+    """Run every building in the batch for `duration` seconds and return the batch's scores. The scenario's
+    update(elapsed, batch) adds riders with batch.add_riders(), and the controller's update(elapsed, batch) returns an
+    array of commands (or None). The controller's update() takes the place of both update() and the event handlers of
+    an ordinary controller: it sees which elevators arrived at a floor or sat idle during the previous second."""
+    for elapsed in range(duration):
+        scenario.update(elapsed, batch)
+        commands = controller.update(elapsed, batch)
+        if commands is not None:
+            batch.command(commands)
+        batch.update(elapsed)
+    return batch.score()